@@ -18,34 +18,57 @@ if "FLASK_RUN_PORT" not in os.environ:
 if "PORT" not in os.environ:
     os.environ["PORT"] = "5001"
 
+import hmac
+import html
 import json
 import logging
-import threading
-from flask import Flask, current_app, flash, jsonify, redirect, request, session, url_for, send_from_directory
+import secrets
+import sqlite3
+import urllib.parse
+from functools import partial, wraps
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Union, cast
+from flask import Flask, Response, current_app, flash, g, jsonify, redirect, request, session, stream_with_context, url_for, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 
-from config import Config
+# orjson is optional - if it isn't installed, responses fall back to Flask's stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from config import Config, is_production
 from models import (
     EmailCategory,
     clear_user_data,
     ensure_tables,
     fetch_analytics,
     fetch_category_summary,
-    fetch_junk_emails,
-    fetch_meetings,
-    fetch_tasks,
     get_credentials_for_user,
     get_email_by_message_id,
     get_or_create_user,
+    get_user_data_version,
     hide_email,
     init_app as init_models,
+    iter_junk_emails,
+    iter_meetings,
+    iter_tasks,
+    pop_oauth_state,
+    release_lock,
+    remove_duplicates,
+    save_oauth_state,
+    try_acquire_lock,
     update_meetings_with_email_dates,
     update_all_meetings_with_email_dates,
     upsert_credentials,
 )
+from models.cache import TTLCache, invalidate_all, invalidate_user
+from models.db import close_connection
 from services.classifier import EmailClassifier
+from services.gmail_client import forget_credentials
 from services.google_auth import fetch_credentials, fetch_user_profile
-from services.gmail_sync import sync_recent_emails
+from services.gmail_sync import extract_html_from_raw_json, sync_recent_emails
 from google_auth_oauthlib.flow import Flow
 from services.inbox_service import get_dashboard_view, process_all_unprocessed, run_background_tick
 from services.job_queue import get_job_queue
@@ -57,6 +80,14 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Resolved once at import: resolve() does realpath syscalls, and these used to be
+# recomputed inside request handlers
+_HERE = Path(__file__).resolve().parent
+_FRONTEND_DIR = _HERE / "frontend"
+# The React app is built to frontend/dist/ and we serve it from there
+_DIST = _FRONTEND_DIR / "dist"
+_ASSETS = _DIST / "assets"
+
 
 def _validate_required_env_vars() -> None:
     """
@@ -93,6 +124,155 @@ def _validate_required_env_vars() -> None:
         )
 
 
+def _iter_for_client(items: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Swap each row's raw_json for the one part of it the frontend renders.
+    
+    raw_json is the full Gmail message (every header, every part, base64-encoded) and
+    was most of the bytes in every list response; the React cards only ever decoded
+    its text/html part, so we send that as html_body instead.
+    """
+    for item in items:
+        item["html_body"] = extract_html_from_raw_json(item.pop("raw_json", None))
+        yield item
+
+
+def _for_client(items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """List form of _iter_for_client, for payloads that get cached."""
+    return list(_iter_for_client(items))
+
+
+def require_user(view):
+    """
+    Reject API calls without a logged-in user; otherwise pass the user's ID in.
+    
+    The wrapped view gets user_id as its first argument (and it's on g.user_id for
+    anything further down the request), instead of every handler repeating the same
+    session lookup and 401.
+    """
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any):
+        user_id = session.get("user_id")
+        if not user_id:
+            return jsonify({"error": "Not authenticated"}), 401
+        g.user_id = user_id
+        return view(user_id, *args, **kwargs)
+    return wrapper
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider that serializes responses with orjson when it's available.
+    
+    The dashboard and list endpoints return large email payloads (bodies + raw_json),
+    and stdlib json spends most of the request encoding them. orjson is a C
+    implementation that's several times faster. Values orjson doesn't handle natively
+    (and datetimes, to keep Flask's format) go through Flask's usual `default` hook.
+    """
+
+    # Key order doesn't matter to the frontend, and sorting costs time on every response
+    sort_keys = False
+
+    @staticmethod
+    def default(o: Any) -> Any:
+        # Let query results be returned as-is, without copying each row into a dict first
+        if isinstance(o, sqlite3.Row):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
+    def _orjson_options(self) -> int:
+        # Only called on the orjson paths, which have already checked it's installed
+        assert orjson is not None
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def dumps(self, obj, **kwargs):
+        # Callers asking for stdlib-specific formatting (indent, etc.) get stdlib json
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Pretty-printed debug output keeps using the stdlib path
+        if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        # Hand orjson's bytes straight to the response - no str round trip
+        body = orjson.dumps(
+            obj,
+            default=self.default,
+            option=self._orjson_options() | orjson.OPT_APPEND_NEWLINE,
+        )
+        return self._make_response(body)
+
+    def _make_response(self, body: Union[bytes, Iterator[bytes]]) -> Response:
+        # self._app is typed as Flask's sansio App, whose response class takes no body
+        return cast(Flask, self._app).response_class(body, mimetype=self.mimetype)
+
+    # Streamed bodies are flushed to the socket in pieces of roughly this size
+    _STREAM_CHUNK_SIZE = 64 * 1024
+
+    def _dumps_bytes(self, obj: Any) -> bytes:
+        if orjson is None:
+            return super().dumps(obj).encode("utf-8")
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options())
+
+    def iter_object(self, obj: Dict[str, Any]) -> Iterator[bytes]:
+        """
+        Serialize a dict as JSON piece by piece instead of as one big string.
+        
+        Top-level lists are encoded one item at a time, so we never hold the whole
+        encoded body in memory, and the first bytes go out before the last item is encoded.
+        """
+        buffer = bytearray(b"{")
+        for index, (key, value) in enumerate(obj.items()):
+            if index:
+                buffer += b","
+            buffer += self._dumps_bytes(str(key)) + b":"
+            if not isinstance(value, list):
+                buffer += self._dumps_bytes(value)
+                continue
+            yield from self._iter_items(value, buffer)
+        buffer += b"}\n"
+        yield bytes(buffer)
+
+    def iter_array(self, items: Iterable[Any]) -> Iterator[bytes]:
+        """
+        Serialize any iterable as a JSON array, one item at a time.
+        
+        Paired with a generator (e.g. rows straight off a cursor), neither the
+        items nor their encoded form are ever all in memory at once.
+        """
+        buffer = bytearray()
+        yield from self._iter_items(items, buffer)
+        buffer += b"\n"
+        yield bytes(buffer)
+
+    def _iter_items(self, items: Iterable[Any], buffer: bytearray) -> Iterator[bytes]:
+        # Appends "[item,item,...]" to buffer, flushing it whenever it fills up
+        buffer += b"["
+        for item_index, item in enumerate(items):
+            if item_index:
+                buffer += b","
+            buffer += self._dumps_bytes(item)
+            if len(buffer) >= self._STREAM_CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+        buffer += b"]"
+
+    def stream_response(self, obj: Union[Dict[str, Any], Iterable[Any]]):
+        """Like response(), but streams the body - a dict as an object, anything else as an array."""
+        chunks = self.iter_object(obj) if isinstance(obj, dict) else self.iter_array(obj)
+        return self._make_response(stream_with_context(chunks))
+
+
 def create_app() -> Flask:
     """
     Create and configure the Flask application.
@@ -113,16 +293,15 @@ def create_app() -> Flask:
     # Instead, we manually serve the React build files in production
     app = Flask(__name__, static_folder=None)
     app.config.from_object(Config)
+    # Kept typed so routes can reach stream_response, which app.json (a plain JSONProvider) lacks
+    json_provider = OrjsonProvider(app)
+    app.json = json_provider
     
     # Configure static file serving for React build in production
-    # The React app is built to frontend/dist/ and we serve it from there
-    from pathlib import Path
-    BASE_DIR = Path(__file__).resolve().parent
-    FRONTEND_DIST = BASE_DIR / "frontend" / "dist"
+    FRONTEND_DIST = _DIST
     
     # Verify frontend is built in production
     # If the dist folder doesn't exist, the build process failed
-    from config import is_production
     if is_production() and not FRONTEND_DIST.exists():
         logger.error("CRITICAL: Frontend dist directory does not exist in production: %s", FRONTEND_DIST)
         logger.error("This indicates the Railway build process failed to build the frontend.")
@@ -148,8 +327,6 @@ def create_app() -> Flask:
     with app.app_context():
         ensure_tables()
 
-    import html
-
     @app.template_filter("unescape")
     def unescape_filter(s):
         if not s:
@@ -165,11 +342,16 @@ def create_app() -> Flask:
     # Create the job queue for background processing (syncing emails, classifying them)
     # Jobs run in separate threads so they don't block web requests
     job_queue = get_job_queue(app=app)
+
+    # Short-lived per-user cache for the /api/dashboard payload
+    # Every open tab polls the dashboard, so this turns repeat polls into a dict lookup
+    # instead of five queries. Entries are dropped as soon as a
+    # sync/classification job or a user action changes the underlying data.
+    # Values are (data_version, payload), so writes from other workers are noticed too.
+    _dashboard_cache = TTLCache(ttl=20)
     
-    # Thread safety: prevent multiple background tasks from running for the same user
-    # This avoids duplicate work and database conflicts
-    _processing_lock = threading.Lock()
-    _processing_active = set()  # Track active user IDs being processed
+    # How long a per-user processing lease lasts if a worker dies without releasing it
+    _PROCESSING_LEASE_SECONDS = 300
 
     def _background_sync_and_process(user_id: int) -> None:
         """
@@ -178,28 +360,26 @@ def create_app() -> Flask:
         This function runs in a separate thread so it doesn't slow down web requests.
         It syncs new emails from Gmail and classifies them using AI.
         """
-        # Check if already processing for this user - avoid duplicate work
-        if user_id in _processing_active:
-            return  # Already processing for this user
-
-        # Thread-safe check: use a lock to prevent race conditions
-        with _processing_lock:
-            if user_id in _processing_active:
-                return
-            _processing_active.add(user_id)
-
+        lock_name = f"processing:user:{user_id}"
         try:
             # Use app context for database operations
             # Flask needs an app context to access the database
             with app.app_context():
                 try:
-                    # Run the background tick: sync emails and classify them
-                    run_background_tick(user_id, classifier)
+                    # Prevent multiple background tasks from running for the same user
+                    # The lease is stored in SQLite, so it also holds across gunicorn workers
+                    if not try_acquire_lock(lock_name, _PROCESSING_LEASE_SECONDS):
+                        return  # Already processing for this user
+                    try:
+                        # Run the background tick: sync emails and classify them
+                        run_background_tick(user_id, classifier)
+                        _dashboard_cache.pop(user_id)
+                    finally:
+                        # Always release the lease, even if there was an error
+                        release_lock(lock_name)
                 finally:
                     # Always close the database connection when done
                     # This prevents connection leaks in background threads
-                    from models.db import close_connection
-
                     try:
                         close_connection()
                     except Exception:
@@ -208,10 +388,6 @@ def create_app() -> Flask:
             # Log unexpected background errors but do not crash the app
             # Background tasks should never bring down the web server
             logger.exception("Unexpected error in background sync/process tick for user %s", user_id)
-        finally:
-            # Always remove user from active set, even if there was an error
-            with _processing_lock:
-                _processing_active.discard(user_id)
 
     def _ensure_session_user() -> int:
         """
@@ -229,40 +405,87 @@ def create_app() -> Flask:
         session.setdefault("user_email", demo["email"])
         return demo["id"]
 
-    @app.route("/")
-    def index():
-        """Default landing page - serve React frontend in production, redirect in dev."""
-        from config import is_production
-        
-        if is_production():
-            # In production, serve the React app directly
-            frontend_dist = BASE_DIR / "frontend" / "dist"
-            index_path = frontend_dist / "index.html"
-            if index_path.exists():
-                return send_from_directory(str(frontend_dist), "index.html")
+    # Resolve the SPA settings once - they don't change while the process is running,
+    # so there's no reason to re-import config or stat() index.html on every navigation
+    _PROD = is_production()
+    _INDEX_EXISTS = (FRONTEND_DIST / "index.html").exists()
+    _FRONTEND_URL = frontend_url
+    # Same for the build directory itself: serve_frontend runs for every JS/CSS/image
+    # request, so it only does the one stat() needed to find the requested file
+    _DIST_EXISTS = FRONTEND_DIST.exists()
+    _DIST_DIR = str(FRONTEND_DIST)
+    _ASSETS_DIR = str(_ASSETS)
+    # First path segments that only the backend serves. A miss under one of these
+    # (typo, wrong method, removed endpoint) is a 404, not the SPA's index.html
+    _BACKEND_ROOTS = frozenset({
+        "api", "hide-email", "open_email", "sync", "process",
+        "clear-data", "remove-duplicates", "logout",
+    })
+
+    # Vite fingerprints every file it writes to dist/assets/ (e.g. index-3f2a1c.js), so the
+    # browser can keep those forever and never ask Flask for them again. index.html is the
+    # only file that changes between deploys, so it must always be revalidated.
+    _ASSET_MAX_AGE = 365 * 24 * 60 * 60  # One year
+
+    def _send_index():
+        """Send the SPA shell, telling the browser to revalidate it on every navigation."""
+        response = send_from_directory(_DIST_DIR, "index.html")
+        response.cache_control.no_cache = True
+        return response
+
+    def _send_asset(directory: str, filename: str):
+        """Send a fingerprinted build asset with a long-lived, immutable cache header."""
+        response = send_from_directory(directory, filename, max_age=_ASSET_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    def _serve_spa(subpath: str = ""):
+        """Serve the React frontend in production, redirect to the Vite dev server in dev."""
+        if _PROD:
+            if _INDEX_EXISTS:
+                return _send_index()
             # Fallback if build doesn't exist
             return jsonify({"error": "Frontend not built"}), 500
-        else:
-            # In development, redirect to Vite dev server
-            frontend_url = os.getenv("FRONTEND_REDIRECT_URL", "http://localhost:5173")
-            return redirect(frontend_url)
-
-    @app.route("/dashboard")
-    def dashboard():
-        """Serve React frontend dashboard (handled by SPA catch-all in production)."""
-        from config import is_production
-        
-        if is_production():
-            # Let the catch-all route handle it
-            frontend_dist = BASE_DIR / "frontend" / "dist"
-            index_path = frontend_dist / "index.html"
-            if index_path.exists():
-                return send_from_directory(str(frontend_dist), "index.html")
-            return jsonify({"error": "Frontend not built"}), 500
-        else:
-            # In development, redirect to Vite dev server
-            frontend_url = os.getenv("FRONTEND_REDIRECT_URL", "http://localhost:5173")
-            return redirect(f"{frontend_url}/dashboard")
+        # In development, redirect to Vite dev server
+        return redirect(f"{_FRONTEND_URL}/{subpath}" if subpath else _FRONTEND_URL)
+
+    # Every SPA page shares the same handler; the endpoint names are kept so
+    # url_for("index") / url_for("dashboard") keep working
+    for endpoint, subpath in (
+        ("index", ""),
+        ("dashboard", "dashboard"),
+        ("meetings_view", "meetings"),
+        ("tasks_view", "tasks"),
+        ("junk_view", "junk"),
+        ("analytics_view", "analytics"),
+    ):
+        app.add_url_rule(f"/{subpath}", endpoint, partial(_serve_spa, subpath))
+
+    # OAuth state lives server-side in SQLite, keyed by a random id in this cookie.
+    # That keeps the session cookie small and works no matter which worker gets the callback.
+    _OAUTH_STATE_COOKIE = "oauth_sid"
+    _OAUTH_STATE_TTL = 10 * 60  # Seconds the user has to finish logging in with Google
+
+    # The OAuth client settings come from config and never change at runtime,
+    # so build them once instead of on every /login hit
+    _OAUTH_REDIRECT_URI = app.config.get("GOOGLE_REDIRECT_URI")
+    _OAUTH_CLIENT_CONFIG = {
+        "web": {
+            "client_id": app.config.get("GOOGLE_CLIENT_ID"),  # Our app's ID from Google Cloud Console
+            "client_secret": app.config.get("GOOGLE_CLIENT_SECRET"),  # Our app's secret
+            "redirect_uris": [_OAUTH_REDIRECT_URI],  # Where to send users after they log in
+            "auth_uri": "https://accounts.google.com/o/oauth2/auth",  # Google's login page
+            "token_uri": "https://oauth2.googleapis.com/token",  # Where to exchange codes for tokens
+        }
+    }
+    # Scopes = what permissions we're asking for
+    _OAUTH_SCOPES = app.config.get("GOOGLE_SCOPES", [
+        "openid",  # Basic user identity
+        "https://www.googleapis.com/auth/userinfo.email",  # User's email address
+        "https://www.googleapis.com/auth/userinfo.profile",  # User's name
+        "https://www.googleapis.com/auth/gmail.readonly",  # Read Gmail (but not send/delete)
+    ])
 
     @app.route("/login")
     def login():
@@ -272,40 +495,21 @@ def create_app() -> Flask:
         When a user clicks "Login", they're redirected here. This route:
         1. Creates a Google OAuth flow with our app's credentials
         2. Generates a unique state token for security
-        3. Saves the state in the session
+        3. Saves the state server-side, keyed by a short-lived cookie
         4. Redirects the user to Google's login page
         
         After the user logs in with Google, Google redirects them back to /oauth2callback
         """
         try:
-            # Get redirect URI from config - this is where Google sends users after login
-            redirect_uri = current_app.config.get("GOOGLE_REDIRECT_URI")
-            if not redirect_uri:
+            # Redirect URI is where Google sends users after login
+            if not _OAUTH_REDIRECT_URI:
                 raise RuntimeError("GOOGLE_REDIRECT_URI not configured")
             
             # Construct Google OAuth Flow
             # This tells Google who we are and what permissions we want
-            client_config = {
-                "web": {
-                    "client_id": current_app.config.get("GOOGLE_CLIENT_ID"),  # Our app's ID from Google Cloud Console
-                    "client_secret": current_app.config.get("GOOGLE_CLIENT_SECRET"),  # Our app's secret
-                    "redirect_uris": [redirect_uri],  # Where to send users after they log in
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",  # Google's login page
-                    "token_uri": "https://oauth2.googleapis.com/token",  # Where to exchange codes for tokens
-                }
-            }
-            # Scopes = what permissions we're asking for
-            scopes = current_app.config.get("GOOGLE_SCOPES", [
-                "openid",  # Basic user identity
-                "https://www.googleapis.com/auth/userinfo.email",  # User's email address
-                "https://www.googleapis.com/auth/userinfo.profile",  # User's name
-                "https://www.googleapis.com/auth/gmail.readonly",  # Read Gmail (but not send/delete)
-            ])
-            
-            # Create the OAuth flow object
-            flow = Flow.from_client_config(client_config, scopes=scopes)
+            flow = Flow.from_client_config(_OAUTH_CLIENT_CONFIG, scopes=_OAUTH_SCOPES)
             # Set redirect_uri from config
-            flow.redirect_uri = redirect_uri
+            flow.redirect_uri = _OAUTH_REDIRECT_URI
             
             # Generate authorization URL and state
             # The state is a random token we use to verify the callback is legitimate
@@ -316,20 +520,29 @@ def create_app() -> Flask:
                 prompt="consent",  # Always show consent screen (ensures we get refresh token)
             )
             
-            # Save state in session - CRITICAL for OAuth validation
+            # Save state server-side - CRITICAL for OAuth validation
             # When Google redirects back, we check that the state matches
             # This proves the callback came from Google, not an attacker
-            session.permanent = True  # Make session last longer
-            session["oauth_state"] = state
-            session.modified = True  # Ensure session is saved
+            sid = secrets.token_urlsafe(24)
+            save_oauth_state(sid, state, _OAUTH_STATE_TTL)
             
             logger.info("OAuth flow started: state=%s (first 8 chars), redirect_uri=%s", 
                        state[:8] if state else None,
-                       redirect_uri)
+                       _OAUTH_REDIRECT_URI)
             
             # Redirect to Google OAuth URL (never redirects to /oauth2callback directly)
             # The user will see Google's login page, then Google redirects to /oauth2callback
-            return redirect(auth_url)
+            response = redirect(auth_url)
+            # Lax is enough: Google's redirect back to us is a top-level GET navigation
+            response.set_cookie(
+                _OAUTH_STATE_COOKIE,
+                sid,
+                max_age=_OAUTH_STATE_TTL,
+                httponly=True,
+                secure=_PROD,
+                samesite="Lax",
+            )
+            return response
         except Exception as e:
             logger.exception("Error in login route: %s", e)
             return (
@@ -357,53 +570,38 @@ def create_app() -> Flask:
         CRITICAL: Ignores empty callback calls (no query params) to prevent
         reload loops when frontend isn't built or app reloads.
         """
-        # Helper function to get query args - handles Railway reverse proxy stripping
-        # Sometimes Railway's reverse proxy strips query parameters, so we need a workaround
-        def get_query_arg(key: str, default=None):
-            """
-            Get query argument, trying request.args first, then manual parsing.
-            
-            This handles cases where Railway's reverse proxy might strip query parameters.
-            We try Flask's normal way first, then manually parse the query string if needed.
-            """
-            # Try request.args first (normal Flask behavior)
-            if request.args.get(key):
-                return request.args.get(key)
-            # If empty, try parsing query_string manually (Railway reverse proxy workaround)
-            if request.query_string:
-                import urllib.parse
-                try:
-                    # Manually parse the query string
-                    parsed = urllib.parse.parse_qs(request.query_string.decode('utf-8'))
-                    if key in parsed and parsed[key]:
-                        logger.info(f"Found {key} in manually parsed query string")
-                        return parsed[key][0]
-                except Exception as e:
-                    logger.error(f"Failed to parse query string for {key}: {e}")
-            return default
+        # Parse the query string once - request.args normally has everything, but
+        # Railway's reverse proxy has been seen to strip it, so fall back to parsing
+        # the raw query string ourselves
+        query_args = request.args
+        if not query_args and request.query_string:
+            query_args = dict(urllib.parse.parse_qsl(request.query_string.decode("utf-8", "replace")))
+            logger.info("Parsed OAuth callback args from the raw query string")
         
         # GUARD: Ignore empty callback calls (no query params)
         # This happens when the app reloads after frontend build error or SPA prefetch
         # Without this guard, we'd get stuck in a reload loop
-        if not request.args:
+        if not query_args:
             current_app.logger.info("Ignoring empty /oauth2callback hit")
             return "", 204
         
         # CRITICAL DEBUG LOGGING - Log everything about the request
         # This helps debug OAuth issues in production
-        logger.info("=" * 80)
-        logger.info("OAUTH2CALLBACK ROUTE HIT (with query params)")
-        logger.info(f"Request URL: {request.url}")
-        logger.info(f"Request query_string: {request.query_string.decode('utf-8') if request.query_string else 'EMPTY'}")
-        logger.info(f"Request args: {dict(request.args)}")
-        logger.info(f"Session oauth_state: {session.get('oauth_state', 'NOT FOUND')}")
-        logger.info("=" * 80)
+        # (guarded so the URL/args aren't rebuilt just to be dropped when INFO is off)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("=" * 80)
+            logger.info("OAUTH2CALLBACK ROUTE HIT (with query params)")
+            logger.info("Request URL: %s", request.url)
+            logger.info("Request query_string: %s", request.query_string.decode('utf-8') if request.query_string else 'EMPTY')
+            logger.info("Request args: %s", dict(request.args))
+            logger.info("OAuth state cookie present: %s", _OAUTH_STATE_COOKIE in request.cookies)
+            logger.info("=" * 80)
         
         # Check for OAuth errors from Google (e.g., user denied access)
         # If the user clicks "Cancel" on Google's login page, Google sends an error
-        error = get_query_arg("error")
+        error = query_args.get("error")
         if error:
-            error_description = get_query_arg("error_description", "OAuth authentication failed")
+            error_description = query_args.get("error_description", "OAuth authentication failed")
             logger.warning("OAuth error from Google: %s - %s", error, error_description)
             return (
                 f"<h1>OAuth Error</h1><p>{error_description}</p><p>Please try logging in again.</p>",
@@ -411,11 +609,13 @@ def create_app() -> Flask:
             )
         
         # Get state from Google's callback - this should match what we saved earlier
-        received_state = get_query_arg("state")
+        received_state = query_args.get("state")
         # Also get code for token exchange - this is what we trade for an access token
-        auth_code = get_query_arg("code")
-        # Get stored state from session - this is what we saved when they clicked login
-        stored_state = session.get("oauth_state")
+        auth_code = query_args.get("code")
+        # Get stored state - this is what we saved when they clicked login
+        # Popping it means the same state can never be used for a second callback
+        sid = request.cookies.get(_OAUTH_STATE_COOKIE)
+        stored_state = pop_oauth_state(sid) if sid else None
         
         # Debug logging
         logger.info("OAuth state check: received=%s, stored=%s", received_state, stored_state)
@@ -434,7 +634,7 @@ def create_app() -> Flask:
         
         if not stored_state:
             # Session expired or cookies blocked - user needs to log in again
-            logger.error("Session does not contain oauth_state. Session keys: %s", list(session.keys()))
+            logger.error("No stored OAuth state for this browser (cookie present: %s)", bool(sid))
             return (
                 "<h1>Session Error</h1><p>The OAuth session state was not found. "
                 "This may happen if cookies are blocked, the session expired, or you're using multiple browser tabs. "
@@ -442,7 +642,9 @@ def create_app() -> Flask:
                 400,
             )
         
-        if received_state != stored_state:
+        # compare_digest takes the same time wherever the strings differ, so response
+        # timing can't be used to guess a valid state one character at a time
+        if not hmac.compare_digest(received_state.encode("utf-8"), stored_state.encode("utf-8")):
             # States don't match - possible attack or session issue
             logger.warning("OAuth state mismatch: received=%s, stored=%s", received_state, stored_state)
             return (
@@ -467,7 +669,7 @@ def create_app() -> Flask:
                 query_parts.append(f"error={error}")
             
             auth_response_url = f"{base_url}?{'&'.join(query_parts)}" if query_parts else request.url
-            logger.info(f"Using authorization_response URL: {auth_response_url}")
+            logger.info("Using authorization_response URL: %s", auth_response_url)
             
             # Exchange the authorization code for an access token and refresh token
             # The access token lets us make API calls to Gmail
@@ -505,10 +707,10 @@ def create_app() -> Flask:
             refresh_token=refresh_token or "",  # Refresh token (never expires, but can be revoked)
             token_expiry=credentials.expiry.isoformat() if credentials.expiry else None,  # When access token expires
         )
+        # This process may still hold the previous tokens; use the new ones from now on
+        forget_credentials(user["id"])
         
-        # Clear OAuth state and set user session
-        # We don't need the state anymore, and we want to mark the user as logged in
-        session.pop("oauth_state", None)
+        # Set user session (the stored OAuth state was already consumed above)
         session["user_id"] = user["id"]  # Store user ID in session
         session["user_email"] = user["email"]  # Store email in session
         session.modified = True  # Mark session as modified so Flask saves it
@@ -517,67 +719,9 @@ def create_app() -> Flask:
         # The user is now logged in and can use the app
         frontend_redirect = os.getenv("FRONTEND_REDIRECT_URL", "http://localhost:5173")
         logger.info("OAuth login successful for user %s, redirecting to frontend", user["email"])
-        return redirect(frontend_redirect)
-
-    @app.route("/meetings")
-    def meetings_view():
-        """Serve React frontend meetings page (handled by SPA catch-all in production)."""
-        from config import is_production
-        
-        if is_production():
-            frontend_dist = BASE_DIR / "frontend" / "dist"
-            index_path = frontend_dist / "index.html"
-            if index_path.exists():
-                return send_from_directory(str(frontend_dist), "index.html")
-            return jsonify({"error": "Frontend not built"}), 500
-        else:
-            frontend_url = os.getenv("FRONTEND_REDIRECT_URL", "http://localhost:5173")
-            return redirect(f"{frontend_url}/meetings")
-
-    @app.route("/tasks")
-    def tasks_view():
-        """Serve React frontend tasks page (handled by SPA catch-all in production)."""
-        from config import is_production
-        
-        if is_production():
-            frontend_dist = BASE_DIR / "frontend" / "dist"
-            index_path = frontend_dist / "index.html"
-            if index_path.exists():
-                return send_from_directory(str(frontend_dist), "index.html")
-            return jsonify({"error": "Frontend not built"}), 500
-        else:
-            frontend_url = os.getenv("FRONTEND_REDIRECT_URL", "http://localhost:5173")
-            return redirect(f"{frontend_url}/tasks")
-
-    @app.route("/junk")
-    def junk_view():
-        """Serve React frontend junk page (handled by SPA catch-all in production)."""
-        from config import is_production
-        
-        if is_production():
-            frontend_dist = BASE_DIR / "frontend" / "dist"
-            index_path = frontend_dist / "index.html"
-            if index_path.exists():
-                return send_from_directory(str(frontend_dist), "index.html")
-            return jsonify({"error": "Frontend not built"}), 500
-        else:
-            frontend_url = os.getenv("FRONTEND_REDIRECT_URL", "http://localhost:5173")
-            return redirect(f"{frontend_url}/junk")
-
-    @app.route("/analytics")
-    def analytics_view():
-        """Serve React frontend analytics page (handled by SPA catch-all in production)."""
-        from config import is_production
-        
-        if is_production():
-            frontend_dist = BASE_DIR / "frontend" / "dist"
-            index_path = frontend_dist / "index.html"
-            if index_path.exists():
-                return send_from_directory(str(frontend_dist), "index.html")
-            return jsonify({"error": "Frontend not built"}), 500
-        else:
-            frontend_url = os.getenv("FRONTEND_REDIRECT_URL", "http://localhost:5173")
-            return redirect(f"{frontend_url}/analytics")
+        response = redirect(frontend_redirect)
+        response.delete_cookie(_OAUTH_STATE_COOKIE)
+        return response
 
     # ------------------------------------------------------------------ #
     # JSON API endpoints for React frontend
@@ -586,7 +730,8 @@ def create_app() -> Flask:
     # They don't return HTML - just raw data
 
     @app.route("/api/dashboard")
-    def api_dashboard():
+    @require_user
+    def api_dashboard(user_id: int):
         """
         Return dashboard payload as JSON for React frontend.
         
@@ -597,123 +742,75 @@ def create_app() -> Flask:
         - Recent tasks
         - Recent junk emails
         """
-        user_id = session.get("user_id")
-        if not user_id:
-            return jsonify({"error": "Not authenticated"}), 401
+        # The data version changes on every write to this user's rows (SQLite triggers),
+        # so it doubles as an ETag: if the browser already has this version, it gets a
+        # bodiless 304 and we skip the queries and serialization entirely
+        version = get_user_data_version(user_id)
+        etag = f"{user_id}-{version}"
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            # Serve repeat polls from the cache (see _dashboard_cache above), as long as
+            # nothing has been written since - even by another worker process
+            cached = _dashboard_cache.get(user_id)
+            if cached is not None and cached[0] == version:
+                payload = cached[1]
+            else:
+                # Get all dashboard data
+                sync_stats, analytics, meetings, tasks, junk_emails = get_dashboard_view(user_id)
+                
+                # meetings/tasks/junk_emails are already shaped similarly to templates; they can be
+                # consumed directly by the React app.
+                payload = {
+                    "sync_stats": sync_stats,
+                    "analytics": analytics,
+                    "meetings": _for_client(meetings),
+                    "tasks": _for_client(tasks),
+                    "junk_emails": _for_client(junk_emails),
+                }
+                _dashboard_cache.set(user_id, (version, payload))
+            # Big inboxes make this a multi-MB body - stream it rather than building it in one go
+            response = json_provider.stream_response(payload)
         
-        # Get all dashboard data
-        sync_stats, analytics, meetings, tasks, junk_emails = get_dashboard_view(user_id)
-        
-        # Backfill body from raw_json if body is empty for all email lists
-        # Sometimes the email body wasn't extracted during sync, so we extract it now
-        from services.gmail_sync import extract_body_from_raw_json
-        
-        # For each meeting, if the body is missing, try to extract it from raw_json
-        for meeting in meetings:
-            if not meeting.get("body") or not meeting.get("body", "").strip():
-                raw_json = meeting.get("raw_json")
-                if raw_json:
-                    extracted_body = extract_body_from_raw_json(raw_json)
-                    if extracted_body:
-                        meeting["body"] = extracted_body
-        
-        # Same for tasks
-        for task in tasks:
-            if not task.get("body") or not task.get("body", "").strip():
-                raw_json = task.get("raw_json")
-                if raw_json:
-                    extracted_body = extract_body_from_raw_json(raw_json)
-                    if extracted_body:
-                        task["body"] = extracted_body
-        
-        # Same for junk emails
-        for email in junk_emails:
-            if not email.get("body") or not email.get("body", "").strip():
-                raw_json = email.get("raw_json")
-                if raw_json:
-                    extracted_body = extract_body_from_raw_json(raw_json)
-                    if extracted_body:
-                        email["body"] = extracted_body
-        
-        # meetings/tasks/junk_emails are already shaped similarly to templates; they can be
-        # consumed directly by the React app.
-        return jsonify(
-            {
-                "sync_stats": sync_stats,
-                "analytics": analytics,
-                "meetings": meetings,
-                "tasks": tasks,
-                "junk_emails": junk_emails,
-            }
-        )
+        response.set_etag(etag)
+        # Private: per-user data. no-cache: the browser may keep it but must revalidate
+        # every poll, so a hide/sync shows up immediately
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
 
     @app.route("/api/meetings")
-    def api_meetings():
-        user_id = session.get("user_id")
-        if not user_id:
-            return jsonify({"error": "Not authenticated"}), 401
-        meetings = fetch_meetings(user_id)
-        # Backfill body from raw_json if body is empty
-        from services.gmail_sync import extract_body_from_raw_json
-        for meeting in meetings:
-            if not meeting.get("body") or not meeting.get("body", "").strip():
-                raw_json = meeting.get("raw_json")
-                if raw_json:
-                    extracted_body = extract_body_from_raw_json(raw_json)
-                    if extracted_body:
-                        meeting["body"] = extracted_body
-        return jsonify(meetings)
+    @require_user
+    def api_meetings(user_id: int):
+        # Bodies are extracted and stored at sync time (backfill_missing_bodies).
+        # Rows are encoded and sent as they come off the cursor
+        return json_provider.stream_response(_iter_for_client(iter_meetings(user_id)))
 
     @app.route("/api/tasks")
-    def api_tasks():
-        user_id = session.get("user_id")
-        if not user_id:
-            return jsonify({"error": "Not authenticated"}), 401
-        tasks = fetch_tasks(user_id)
-        # Backfill body from raw_json if body is empty
-        from services.gmail_sync import extract_body_from_raw_json
-        for task in tasks:
-            if not task.get("body") or not task.get("body", "").strip():
-                raw_json = task.get("raw_json")
-                if raw_json:
-                    extracted_body = extract_body_from_raw_json(raw_json)
-                    if extracted_body:
-                        task["body"] = extracted_body
-        return jsonify(tasks)
+    @require_user
+    def api_tasks(user_id: int):
+        # Bodies are extracted and stored at sync time (backfill_missing_bodies).
+        # Rows are encoded and sent as they come off the cursor
+        return json_provider.stream_response(_iter_for_client(iter_tasks(user_id)))
 
     @app.route("/api/junk")
-    def api_junk():
-        user_id = session.get("user_id")
-        if not user_id:
-            return jsonify({"error": "Not authenticated"}), 401
-        junk_emails = fetch_junk_emails(user_id)
-        # Backfill body from raw_json if body is empty
-        from services.gmail_sync import extract_body_from_raw_json
-        for email in junk_emails:
-            if not email.get("body") or not email.get("body", "").strip():
-                raw_json = email.get("raw_json")
-                if raw_json:
-                    extracted_body = extract_body_from_raw_json(raw_json)
-                    if extracted_body:
-                        email["body"] = extracted_body
-        return jsonify(junk_emails)
+    @require_user
+    def api_junk(user_id: int):
+        # Bodies are extracted and stored at sync time (backfill_missing_bodies).
+        # Rows are encoded and sent as they come off the cursor
+        return json_provider.stream_response(_iter_for_client(iter_junk_emails(user_id)))
 
     @app.route("/api/analytics")
-    def api_analytics():
-        user_id = session.get("user_id")
-        if not user_id:
-            return jsonify({"error": "Not authenticated"}), 401
+    @require_user
+    def api_analytics(user_id: int):
         analytics = fetch_analytics(user_id)
         summary = fetch_category_summary(user_id)
         return jsonify({"analytics": analytics, "summary": summary})
 
     @app.route("/api/update-meeting-dates", methods=["POST"])
-    def api_update_meeting_dates():
+    @require_user
+    def api_update_meeting_dates(user_id: int):
         """Update meetings with missing or invalid start_time to use email dates."""
-        user_id = session.get("user_id")
-        if not user_id:
-            return jsonify({"error": "Not authenticated"}), 401
-        
         # Get update mode from request (default to conservative update)
         update_all = False
         if request.is_json and request.json:
@@ -726,6 +823,8 @@ def create_app() -> Flask:
             else:
                 # Conservative: only update meetings with clearly missing/invalid dates
                 count = update_meetings_with_email_dates()
+            # These updates aren't scoped to one user, so drop every cached dashboard
+            invalidate_all()
             
             return jsonify({
                 "success": True,
@@ -737,7 +836,8 @@ def create_app() -> Flask:
             return jsonify({"error": str(e)}), 500
 
     @app.route("/api/sync", methods=["POST"])
-    def api_sync():
+    @require_user
+    def api_sync(user_id: int):
         """
         Start a background Gmail sync job. Returns immediately.
         
@@ -745,10 +845,6 @@ def create_app() -> Flask:
         It doesn't wait for the sync to finish - it just queues the job and returns.
         The frontend can check the job status using /api/sync/status/<job_id>
         """
-        user_id = session.get("user_id")
-        if not user_id:
-            return jsonify({"error": "Not authenticated"}), 401
-        
         # Get max_results from request, default to 500
         # This is how many emails to fetch from Gmail
         max_results = 500
@@ -765,9 +861,10 @@ def create_app() -> Flask:
             job_type="gmail_sync",
             user_id=user_id,
             execute_fn=sync_job._execute_fn,
+            max_retries=2,  # Gmail API hiccups (429/5xx) are usually transient
         )
         
-        logger.info(f"Enqueued sync job {job_id} for user {user_id}")
+        logger.info("Enqueued sync job %s for user %s", job_id, user_id)
         
         return jsonify({
             "status": "queued",  # Job is in the queue, not running yet
@@ -776,12 +873,9 @@ def create_app() -> Flask:
         })
 
     @app.route("/api/sync/status/<job_id>")
-    def api_sync_status(job_id: str):
+    @require_user
+    def api_sync_status(user_id: int, job_id: str):
         """Get the status of a sync job."""
-        user_id = session.get("user_id")
-        if not user_id:
-            return jsonify({"error": "Not authenticated"}), 401
-        
         job_queue = get_job_queue()
         job = job_queue.get_job(job_id)
         
@@ -827,13 +921,13 @@ def create_app() -> Flask:
             return redirect(url_for("index"))
         
         hide_email(user_id, email_id)
+        invalidate_user(user_id)
         # Return to the page that made the request, or dashboard
         referer = request.headers.get("Referer")
         if referer:
             # Extract path from referer
             try:
-                from urllib.parse import urlparse
-                parsed = urlparse(referer)
+                parsed = urllib.parse.urlparse(referer)
                 if parsed.path:
                     return redirect(parsed.path)
             except Exception:
@@ -841,14 +935,12 @@ def create_app() -> Flask:
         return redirect(url_for("dashboard"))
 
     @app.route("/api/hide-email/<int:email_id>", methods=["POST"])
-    def api_hide_email(email_id: int):
+    @require_user
+    def api_hide_email(user_id: int, email_id: int):
         """Hide an email via API (for React frontend)."""
-        user_id = session.get("user_id")
-        if not user_id:
-            return jsonify({"error": "Not authenticated"}), 401
-        
         try:
             hide_email(user_id, email_id)
+            invalidate_user(user_id)
             return jsonify({"success": True, "message": "Email hidden"})
         except Exception as e:
             logger.exception("Error hiding email %s: %s", email_id, e)
@@ -863,6 +955,7 @@ def create_app() -> Flask:
             return redirect(url_for("index"))
         
         clear_user_data(user_id)
+        invalidate_user(user_id)
         session.clear()
         flash("All data cleared. Please log in again.", "success")
         return redirect(url_for("index"))
@@ -876,8 +969,8 @@ def create_app() -> Flask:
             return redirect(url_for("index"))
         
         try:
-            from models import remove_duplicates
             remove_duplicates()
+            invalidate_all()
             flash("Duplicates removed successfully.", "success")
         except Exception as e:
             flash(f"Error removing duplicates: {str(e)}", "error")
@@ -892,6 +985,7 @@ def create_app() -> Flask:
             return redirect(url_for("index"))
         synced_emails = sync_recent_emails(user_id=user_id, max_results=300)
         processed = process_all_unprocessed(user_id, classifier)
+        invalidate_user(user_id)
         flash(
             f"Synced {len(synced_emails)} emails from Gmail. Processed {processed} emails with AI.",
             "success",
@@ -906,6 +1000,7 @@ def create_app() -> Flask:
             flash("Please log in with Google first.", "warning")
             return redirect(url_for("index"))
         processed = process_all_unprocessed(user_id, classifier)
+        invalidate_user(user_id)
         if processed:
             flash(f"Processed {processed} emails with Pare AI.", "success")
         else:
@@ -931,7 +1026,8 @@ def create_app() -> Flask:
         if raw_json_str:
             try:
                 if isinstance(raw_json_str, str):
-                    raw_json = json.loads(raw_json_str)
+                    # app.json parses with orjson when it's installed
+                    raw_json = app.json.loads(raw_json_str)
                 else:
                     raw_json = raw_json_str
                 thread_id = raw_json.get("threadId")
@@ -966,22 +1062,24 @@ def create_app() -> Flask:
         - Serves static assets (JS, CSS, images) from frontend/dist
         - Serves index.html for SPA routes (React Router handles client-side routing)
         - Returns 204 for /oauth2callback to prevent reload loops
+        - Returns a JSON 404 for unknown backend paths (/api/..., /sync, ...)
         - Logs warning if dist is missing (doesn't break OAuth)
         
         The route order is important: this must come LAST so it doesn't catch API routes.
         """
-        dist = Path(__file__).resolve().parent / "frontend" / "dist"
+        # Unknown backend URLs get a cheap JSON 404 before any filesystem checks
+        if path.split("/", 1)[0] in _BACKEND_ROOTS:
+            return jsonify({"error": "Not found"}), 404
         
         # If dist does not exist, do not break OAuth
         # OAuth callback should still work even if frontend isn't built
-        if not dist.exists():
-            current_app.logger.error("Frontend dist missing at: %s", dist)
+        if not _DIST_EXISTS:
+            current_app.logger.error("Frontend dist missing at: %s", FRONTEND_DIST)
             current_app.logger.error("Current working directory: %s", Path.cwd())
-            current_app.logger.error("App file location: %s", Path(__file__).resolve().parent)
+            current_app.logger.error("App file location: %s", _HERE)
             # List what's actually in frontend directory (for debugging)
-            frontend_dir = Path(__file__).resolve().parent / "frontend"
-            if frontend_dir.exists():
-                current_app.logger.error("Frontend directory contents: %s", list(frontend_dir.iterdir()))
+            if _FRONTEND_DIR.exists():
+                current_app.logger.error("Frontend directory contents: %s", list(_FRONTEND_DIR.iterdir()))
             return {"error": "Frontend not built"}, 500
         
         # Never let SPA fallback hijack the OAuth callback
@@ -991,21 +1089,23 @@ def create_app() -> Flask:
         
         # Try to serve the requested file if it exists
         # This handles static assets like JS, CSS, images
-        target = dist / path
-        if path and target.exists() and target.is_file():
-            return send_from_directory(str(dist), path)
-        
-        # Check in assets subdirectory (Vite puts assets there)
-        # Vite builds the React app and puts JS/CSS files in an assets/ folder
+        # (isfile() is a single stat(); send_from_directory still rejects paths
+        # that would escape the directory)
         if path:
-            assets_target = dist / "assets" / path
-            if assets_target.exists() and assets_target.is_file():
-                return send_from_directory(str(dist / "assets"), path)
+            if os.path.isfile(os.path.join(_DIST_DIR, path)):
+                if path.startswith("assets/"):
+                    return _send_asset(_DIST_DIR, path)
+                return send_from_directory(_DIST_DIR, path)
+            
+            # Check in assets subdirectory (Vite puts assets there)
+            # Vite builds the React app and puts JS/CSS files in an assets/ folder
+            if os.path.isfile(os.path.join(_ASSETS_DIR, path)):
+                return _send_asset(_ASSETS_DIR, path)
         
         # For all other routes (including root), serve index.html (SPA fallback)
         # React Router will handle the routing on the client side
         # This is how single-page applications work - all routes serve the same HTML file
-        return send_from_directory(str(dist), "index.html")
+        return _send_index()
 
     return app
 
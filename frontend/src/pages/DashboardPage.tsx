@@ -31,7 +31,7 @@ type EmailSummary = {
   date?: string | null;
   gmail_message_id?: string | null;
   body?: string | null;
-  raw_json?: string | null;
+  html_body?: string | null;
 };
 
 type DashboardPayload = {
@@ -182,7 +182,7 @@ export const DashboardPage: React.FC = () => {
               date={m.date}
               snippet={m.snippet}
               body={m.body}
-              rawJson={m.raw_json}
+              htmlBody={m.html_body}
               gmailMessageId={m.gmail_message_id}
               onDelete={m.email_id ? handleHideEmail : undefined}
               onClick={() => navigate("/meetings")}
@@ -209,7 +209,7 @@ export const DashboardPage: React.FC = () => {
               date={t.date}
               snippet={t.snippet}
               body={t.body}
-              rawJson={t.raw_json}
+              htmlBody={t.html_body}
               gmailMessageId={t.gmail_message_id}
               onDelete={t.email_id ? handleHideEmail : undefined}
               onClick={() => navigate("/tasks")}
@@ -260,7 +260,7 @@ export const DashboardPage: React.FC = () => {
               date={email.date}
               snippet={email.snippet}
               body={email.body}
-              rawJson={email.raw_json}
+              htmlBody={email.html_body}
               gmailMessageId={email.gmail_message_id}
               onDelete={handleHideEmail}
               onClick={() => navigate("/junk")}
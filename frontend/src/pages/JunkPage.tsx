@@ -12,7 +12,7 @@ type JunkEmail = {
   snippet?: string | null;
   body?: string | null;
   gmail_message_id?: string | null;
-  raw_json?: string | null;
+  html_body?: string | null;
   unsubscribe_url?: string | null;
 };
 
@@ -79,7 +79,7 @@ export const JunkPage: React.FC = () => {
               date={email.date}
               snippet={email.snippet}
               body={email.body}
-              rawJson={email.raw_json}
+              htmlBody={email.html_body}
               gmailMessageId={email.gmail_message_id}
               onDelete={handleHideEmail}
               showUnsubscribe={!!email.unsubscribe_url}
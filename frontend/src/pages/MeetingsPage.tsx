@@ -12,7 +12,7 @@ type Meeting = {
   gmail_message_id?: string | null;
   snippet?: string | null;
   body?: string | null;
-  raw_json?: string | null;
+  html_body?: string | null;
   title?: string | null;
   start_time?: string | null;
   end_time?: string | null;
@@ -84,7 +84,7 @@ export const MeetingsPage: React.FC = () => {
               date={meeting.email_date}
               snippet={meeting.snippet}
               body={meeting.body}
-              rawJson={meeting.raw_json}
+              htmlBody={meeting.html_body}
               gmailMessageId={meeting.gmail_message_id}
               onDelete={meeting.email_id ? handleHideEmail : undefined}
               showAddToCalendar={true}
@@ -13,7 +13,7 @@ type Task = {
   gmail_message_id?: string | null;
   snippet?: string | null;
   body?: string | null;
-  raw_json?: string | null;
+  html_body?: string | null;
   description?: string | null;
   due_date?: string | null;
   unsubscribe_url?: string | null;
@@ -82,7 +82,7 @@ export const TasksPage: React.FC = () => {
               date={task.date}
               snippet={task.snippet}
               body={task.body}
-              rawJson={task.raw_json}
+              htmlBody={task.html_body}
               gmailMessageId={task.gmail_message_id}
               onDelete={task.email_id ? handleHideEmail : undefined}
               showAddToKeep={true}
@@ -4,57 +4,115 @@ from __future__ import annotations
 from typing import Any, Dict, List
 
 from . import db
+from .cache import TTLCache
 
 EmailCategory = db.EmailCategory
 init_app = db.init_app
 ensure_tables = db.ensure_tables
+batch = db.batch
 
 # Re-export all db functions
 create_user = db.create_user
 get_user_by_google_id = db.get_user_by_google_id
 get_user_by_id = db.get_user_by_id
+get_user_email = db.get_user_email
 get_or_create_user = db.get_or_create_user
 upsert_credentials = db.upsert_credentials
 get_credentials_for_user = db.get_credentials_for_user
 create_email = db.create_email
+create_emails_bulk = db.create_emails_bulk
 create_classification = db.create_classification
+create_classifications_bulk = db.create_classifications_bulk
+get_cached_classification = db.get_cached_classification
+store_cached_classification = db.store_cached_classification
+touch_cached_classifications = db.touch_cached_classifications
 get_email_by_id = db.get_email_by_id
+get_emails_by_ids = db.get_emails_by_ids
 get_email_by_message_id = db.get_email_by_message_id
 get_all_gmail_message_ids = db.get_all_gmail_message_ids
 get_existing_message_ids = db.get_existing_message_ids
 get_most_recent_email_date = db.get_most_recent_email_date
-get_sync_stats = db.get_sync_stats
+get_sync_context = db.get_sync_context
+get_user_data_version = db.get_user_data_version
 fetch_unclassified_emails = db.fetch_unclassified_emails
+fetch_unclassified_email_ids = db.fetch_unclassified_email_ids
+fetch_emails_missing_body = db.fetch_emails_missing_body
+update_email_bodies = db.update_email_bodies
 fetch_meetings = db.fetch_meetings
 fetch_tasks = db.fetch_tasks
 fetch_junk_emails = db.fetch_junk_emails
-fetch_analytics = db.fetch_analytics
+iter_meetings = db.iter_meetings
+iter_tasks = db.iter_tasks
+iter_junk_emails = db.iter_junk_emails
 create_meeting = db.create_meeting
+create_meetings_bulk = db.create_meetings_bulk
 create_task = db.create_task
+create_tasks_bulk = db.create_tasks_bulk
 create_unsubscribe_entry = db.create_unsubscribe_entry
+add_missing_unsubscribe_entries = db.add_missing_unsubscribe_entries
 get_unsubscribe_for_email = db.get_unsubscribe_for_email
 update_meetings_with_email_dates = db.update_meetings_with_email_dates
 update_all_meetings_with_email_dates = db.update_all_meetings_with_email_dates
 hide_email = db.hide_email
 clear_user_data = db.clear_user_data
 remove_duplicates = db.remove_duplicates
+try_acquire_lock = db.try_acquire_lock
+release_lock = db.release_lock
+save_oauth_state = db.save_oauth_state
+pop_oauth_state = db.pop_oauth_state
+
+
+# Per-user caches for the analytics endpoint and dashboard stats, which the frontend polls.
+# Values are (data_version, result): the version comes from the SQLite triggers that
+# bump on every write to the user's rows, so a cached result is only served while
+# nothing has changed - including writes made by other worker processes.
+_analytics_cache = TTLCache(ttl=30, maxsize=1024)
+_summary_cache = TTLCache(ttl=30, maxsize=1024)
+_sync_stats_cache = TTLCache(ttl=30, maxsize=1024)
+
+
+# Summary buckets, in enum order. Resolved once - iterating the Enum and reading
+# .value on every call is slower than walking a plain tuple of strings
+_CATEGORY_VALUES = tuple(category.value for category in EmailCategory)
+
+
+def _cached_per_user(cache: TTLCache, user_id: int, build):
+    version = db.get_user_data_version(user_id)
+    cached = cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    result = build(user_id)
+    cache.set(user_id, (version, result))
+    return result
+
+
+def fetch_analytics(user_id: int) -> Dict[str, Any]:
+    """Return category counts and totals for a user (cached until their data changes)."""
+    return _cached_per_user(_analytics_cache, user_id, db.fetch_analytics)
+
+
+def get_sync_stats(user_id: int) -> Dict[str, Any]:
+    """Return a user's total/processed/unprocessed counts (cached until their data changes)."""
+    return _cached_per_user(_sync_stats_cache, user_id, db.get_sync_stats)
 
 
 def fetch_category_summary(user_id: int) -> Dict[str, List[Dict[str, Any]]]:
-    """Return dashboard-friendly grouped emails for a user."""
-    rows = db.fetch_emails_with_categories(user_id)
-    summary: Dict[str, List[Dict[str, Any]]] = {
-        category.value: [] for category in EmailCategory
-    }
-    for row in rows:
-        bucket = row.get("category")
-        if bucket and bucket not in summary:
+    """Return dashboard-friendly grouped emails for a user (cached until their data changes)."""
+    return _cached_per_user(_summary_cache, user_id, _build_category_summary)
+
+
+def _build_category_summary(user_id: int) -> Dict[str, List[Dict[str, Any]]]:
+    rows = db.iter_emails_with_categories(user_id)
+    summary: Dict[str, List[Dict[str, Any]]] = {value: [] for value in _CATEGORY_VALUES}
+    # Bind each bucket's append once, so the loop does a single dict lookup per row
+    appends = {bucket: emails.append for bucket, emails in summary.items()}
+    for email_id, subject, snippet, date, bucket in rows:
+        if not bucket:
+            continue
+        append = appends.get(bucket)
+        if append is None:
+            # Category we don't know about (e.g. from an older classifier) - keep it anyway
             summary[bucket] = []
-        if bucket:
-            summary[bucket].append({
-                "id": row.get("id"),
-                "subject": row.get("subject"),
-                "snippet": row.get("snippet"),
-                "date": row.get("date"),
-            })
+            append = appends[bucket] = summary[bucket].append
+        append({"id": email_id, "subject": subject, "snippet": snippet, "date": date})
     return summary
@@ -0,0 +1,83 @@
+"""
+Small in-process caches for read-heavy, per-user data.
+
+This module provides:
+- TTLCache: a thread-safe key -> value store whose entries expire after a fixed TTL
+- invalidate_user(): drop one user's entry from every cache after their data changes
+- invalidate_all(): drop everything (used after maintenance that touches every user)
+
+There is no Redis in this deployment, so each gunicorn worker process keeps its own
+copy. The short TTL bounds how stale another process's copy can get, and the
+invalidation helpers make the current process see its own writes immediately.
+"""
+from __future__ import annotations
+
+import threading
+import time
+import weakref
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Every cache registers itself here so invalidate_user() can reach all of them
+# without callers needing to know which caches exist
+_caches: "weakref.WeakSet[TTLCache]" = weakref.WeakSet()
+
+
+class TTLCache:
+    """
+    Thread-safe cache whose entries expire `ttl` seconds after they were stored.
+
+    Keys are usually user IDs. When the cache is full, the entry that was stored
+    first is evicted, which for per-user data is also the one closest to expiring.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 256) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None if it's missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            with self._lock:
+                # Only drop it if nobody stored a fresh value in the meantime
+                if self._data.get(key) is entry:
+                    del self._data[key]
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store value for key, evicting the oldest entry if the cache is full."""
+        with self._lock:
+            # Re-inserting moves the key to the end, keeping dict order == age order
+            self._data.pop(key, None)
+            if len(self._data) >= self.maxsize:
+                del self._data[next(iter(self._data))]
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def pop(self, key: Hashable) -> None:
+        """Forget the cached value for key (no-op if it isn't cached)."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Forget every cached value."""
+        with self._lock:
+            self._data.clear()
+
+
+def invalidate_user(user_id: int) -> None:
+    """Drop a user's cached data from every cache, e.g. after a sync or a hide."""
+    for cache in list(_caches):
+        cache.pop(user_id)
+
+
+def invalidate_all() -> None:
+    """Drop all cached data, e.g. after maintenance that touches every user's rows."""
+    for cache in list(_caches):
+        cache.clear()
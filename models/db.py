@@ -13,11 +13,16 @@ In production, Railway might provide PostgreSQL, but we use SQLite as the defaul
 from __future__ import annotations
 
 import json
+import os
+import queue
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from enum import Enum
-from typing import Any, Dict, Iterator, List, Optional
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from flask import g
 
@@ -38,6 +43,33 @@ class EmailCategory(str, Enum):
 
 # Key for storing database connection in Flask's g object
 _CONNECTION_KEY = "pare_db_conn"
+# Key for the per-request user_id -> email memo (see get_user_email)
+_USER_EMAILS_KEY = "pare_user_emails"
+
+# Fallback connection per thread for code running outside an app context.
+# There's no teardown to close those, so instead of opening (and leaking) a new
+# connection on every call we keep one per thread and reuse it.
+_thread_local = threading.local()
+
+# Read-only connections shared by every thread in the process (see reader()).
+# WAL lets any number of readers run alongside the one writer, so read queries
+# take one of these instead of opening a fresh connection per request.
+_READER_POOL_SIZE = 4
+_reader_pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=_READER_POOL_SIZE)
+_reader_pool_pid = os.getpid()
+_reader_pool_lock = threading.Lock()
+
+# Write connections handed back by close_connection() for the next app context
+# (request or background job) to reuse, so each one doesn't open a connection and
+# re-run the connection pragmas. SQLite still serializes the writes themselves.
+_WRITER_POOL_SIZE = 4
+_writer_pool: "queue.LifoQueue[_Connection]" = queue.LifoQueue(maxsize=_WRITER_POOL_SIZE)
+_writer_pool_pid = os.getpid()
+_writer_pool_lock = threading.Lock()
+
+# classification_cache rows nobody has used for this long are deleted (see
+# touch_cached_classifications), so the shared table doesn't grow forever
+CLASSIFICATION_CACHE_MAX_AGE_DAYS = 30
 
 DDL_STATEMENTS = [
     """
@@ -71,6 +103,8 @@ DDL_STATEMENTS = [
         snippet TEXT,
         raw_json TEXT,
         hidden INTEGER DEFAULT 0,
+        is_self_sent INTEGER DEFAULT 0,
+        body_checked INTEGER DEFAULT 0,
         created_at TEXT DEFAULT CURRENT_TIMESTAMP,
         UNIQUE (user_id, gmail_message_id),
         FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
@@ -114,6 +148,23 @@ DDL_STATEMENTS = [
     )
     """,
     """
+    -- Named leases shared by every process that opens this database file
+    -- (used to stop two gunicorn workers from syncing the same user at once)
+    CREATE TABLE IF NOT EXISTS processing_locks (
+        name TEXT PRIMARY KEY,
+        expires_at REAL NOT NULL
+    )
+    """,
+    """
+    -- Pending OAuth logins: state token keyed by a random per-browser cookie id
+    -- (kept server-side so every worker can validate the callback)
+    CREATE TABLE IF NOT EXISTS oauth_states (
+        sid TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """,
+    """
     CREATE TABLE IF NOT EXISTS unsubscribe_entries (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         email_id INTEGER NOT NULL UNIQUE,
@@ -123,26 +174,116 @@ DDL_STATEMENTS = [
         FOREIGN KEY (email_id) REFERENCES emails(id) ON DELETE CASCADE
     )
     """,
+    """
+    -- OpenAI classifications of templated mail, keyed by a hash of the model and the
+    -- email's sender/subject/body. Shared by every process and survives restarts, so a
+    -- newsletter seen once is never sent to OpenAI again (see services.classifier).
+    -- last_used is refreshed in batches and drives pruning (touch_cached_classifications)
+    CREATE TABLE IF NOT EXISTS classification_cache (
+        hash TEXT PRIMARY KEY,
+        category TEXT NOT NULL,
+        confidence REAL DEFAULT 0.0,
+        result_json TEXT NOT NULL,
+        last_used TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    -- Per-user counter bumped (by the triggers below) whenever any of the user's
+    -- email data changes. The API uses it as a cheap ETag for the dashboard.
+    CREATE TABLE IF NOT EXISTS user_data_versions (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    """,
 ]
 
 
-def _create_connection() -> sqlite3.Connection:
+def _data_version_triggers() -> List[str]:
+    """
+    Build the triggers that bump user_data_versions on every write.
+    
+    emails rows carry user_id directly; the other tables hang off an email, so their
+    triggers look the user up through email_id.
+    """
+    sources = {
+        "emails": "VALUES ({row}.user_id, 1)",
+        "classifications": "SELECT user_id, 1 FROM emails WHERE id = {row}.email_id",
+        "meetings": "SELECT user_id, 1 FROM emails WHERE id = {row}.email_id",
+        "tasks": "SELECT user_id, 1 FROM emails WHERE id = {row}.email_id",
+        "unsubscribe_entries": "SELECT user_id, 1 FROM emails WHERE id = {row}.email_id",
+    }
+    triggers = []
+    for table, source in sources.items():
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            triggers.append(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_data_version
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO user_data_versions (user_id, version)
+                    {source.format(row=row)}
+                    ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+                END
+                """
+            )
+    return triggers
+
+
+DDL_STATEMENTS += _data_version_triggers()
+
+
+# Per-connection settings, sent to SQLite in a single executescript() call.
+# (journal_mode=WAL is stored in the database file itself, so create_tables sets it
+# once instead of every new connection re-checking it.)
+_CONNECTION_PRAGMAS = """
+    PRAGMA foreign_keys = ON;
+    -- Wait up to 5s for a competing writer. SQLite's own busy handler retries
+    -- after 1, 2, 5, 10, 15, 20, 25ms... in C, rather than us sleeping in Python
+    PRAGMA busy_timeout = 5000;
+    -- In WAL mode NORMAL only syncs at checkpoints - still crash-safe, but commits
+    -- during a sync no longer each wait on an fsync
+    PRAGMA synchronous = NORMAL;
+    -- Read the database through a shared memory map (256 MB) instead of copying pages
+    -- into each connection; the OS page cache then serves every worker's reads
+    PRAGMA mmap_size = 268435456;
+    -- Up to 64 MB of page cache per connection (negative = KiB); allocated lazily
+    PRAGMA cache_size = -65536;
+    -- DISTINCT / ORDER BY temp b-trees stay in memory instead of temp files
+    PRAGMA temp_store = MEMORY;
+"""
+
+
+class _Connection(sqlite3.Connection):
+    """SQLite connection that tracks whether a batch() transaction is open on it."""
+
+    batch_depth: int = 0
+
+
+# Prepared statements kept per connection. Python's default of 100 is close to the
+# number of distinct SQL strings in this module (counting the dynamically built list
+# queries), so hot lookups like get_email_by_message_id could be evicted and
+# re-parsed; 512 keeps all of them compiled for the connection's lifetime.
+_CACHED_STATEMENTS = 512
+
+
+def _create_connection() -> _Connection:
     """Create a new SQLite connection with proper settings for concurrency."""
-    # Add timeout for concurrent access (5 seconds)
-    # Enable WAL mode for better concurrency
-    conn = sqlite3.connect(DB_PATH, timeout=20.0)
+    # timeout=0: waiting on locks is left to PRAGMA busy_timeout below.
+    # check_same_thread=False: pooled connections move between threads, but only
+    # one thread uses a connection at a time (see close_connection)
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=0,
+        check_same_thread=False,
+        factory=_Connection,
+        cached_statements=_CACHED_STATEMENTS,
+    )
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
-    # Enable WAL mode for better concurrency (allows multiple readers and one writer)
-    try:
-        conn.execute("PRAGMA journal_mode = WAL;")
-    except sqlite3.OperationalError:
-        # WAL mode might not be available in some SQLite versions, continue without it
-        pass
+    conn.executescript(_CONNECTION_PRAGMAS)
     return conn
 
 
-def get_connection() -> sqlite3.Connection:
+def get_connection() -> _Connection:
     """
     Return a cached SQLite connection stored on the Flask `g` object.
     
@@ -155,229 +296,463 @@ def get_connection() -> sqlite3.Connection:
         conn = getattr(g, _CONNECTION_KEY, None)
     except RuntimeError:
         # No Flask application context (e.g., in background thread)
-        # Create a new connection for this operation
-        return _create_connection()
+        return _thread_connection()
     
-    # If no connection exists, create one and cache it
+    # If no connection exists, reuse a pooled one (or create one) and cache it
     if conn is None:
-        conn = _create_connection()
+        try:
+            conn = _writers().get_nowait()
+        except queue.Empty:
+            conn = _create_connection()
         setattr(g, _CONNECTION_KEY, conn)
     return conn
 
 
+def _thread_connection() -> _Connection:
+    """Return this thread's fallback connection, creating it on first use."""
+    # Connections must not be shared across fork(), so a child process that
+    # inherited the parent's thread-local opens its own
+    conn = getattr(_thread_local, "conn", None)
+    if conn is None or _thread_local.pid != os.getpid():
+        conn = _create_connection()
+        _thread_local.conn = conn
+        _thread_local.pid = os.getpid()
+    return conn
+
+
+def _create_reader() -> sqlite3.Connection:
+    """
+    Create a pooled read connection.
+    
+    The file is opened with mode=ro, so SQLite opens it without write access and
+    never tries to take a write lock on it; query_only additionally turns any
+    accidental write into an immediate error instead of a wait on the writer.
+    """
+    conn = sqlite3.connect(
+        f"{Path(DB_PATH).resolve().as_uri()}?mode=ro",
+        uri=True,
+        timeout=0,
+        check_same_thread=False,
+        factory=_Connection,
+        cached_statements=_CACHED_STATEMENTS,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_CONNECTION_PRAGMAS + "PRAGMA query_only = 1;")
+    return conn
+
+
+def _writers() -> "queue.LifoQueue[_Connection]":
+    """Return this process's write connection pool (see _readers)."""
+    global _writer_pool, _writer_pool_pid
+    if _writer_pool_pid != os.getpid():
+        with _writer_pool_lock:
+            if _writer_pool_pid != os.getpid():
+                _writer_pool = queue.LifoQueue(maxsize=_WRITER_POOL_SIZE)
+                _writer_pool_pid = os.getpid()
+    return _writer_pool
+
+
+def _readers() -> "queue.LifoQueue[sqlite3.Connection]":
+    """Return this process's reader pool (a forked worker starts with an empty one)."""
+    global _reader_pool, _reader_pool_pid
+    if _reader_pool_pid != os.getpid():
+        with _reader_pool_lock:
+            if _reader_pool_pid != os.getpid():
+                _reader_pool = queue.LifoQueue(maxsize=_READER_POOL_SIZE)
+                _reader_pool_pid = os.getpid()
+    return _reader_pool
+
+
+def _connection_in_transaction() -> Optional[_Connection]:
+    """Return the current write connection if it has uncommitted changes, else None."""
+    try:
+        conn = getattr(g, _CONNECTION_KEY, None)
+    except RuntimeError:
+        conn = getattr(_thread_local, "conn", None)
+        if conn is not None and _thread_local.pid != os.getpid():
+            conn = None
+    if conn is not None and conn.in_transaction:
+        return conn
+    return None
+
+
+@contextmanager
+def reader() -> Iterator[sqlite3.Connection]:
+    """
+    Context manager lending out a pooled read-only connection.
+    
+    Used by the fetch_*/get_* helpers. If the current request or thread has an open
+    write transaction (e.g. inside batch()), its own connection is used instead so
+    the read sees the uncommitted rows.
+    
+    Usage:
+        with reader() as conn:
+            rows = conn.execute("SELECT * FROM users").fetchall()
+    """
+    conn = _connection_in_transaction()
+    if conn is not None:
+        yield conn
+        return
+    pool = _readers()
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        # Every pooled reader is busy - open another; it's closed on return if the pool is full
+        conn = _create_reader()
+    try:
+        yield conn
+    finally:
+        # Never hand the next borrower a connection pinned to an old snapshot
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
 def close_connection(_: Optional[BaseException] = None) -> None:
-    """Close the cached SQLite connection if it exists."""
+    """Release the cached SQLite connection, returning it to the writer pool if it can be reused."""
     conn = getattr(g, _CONNECTION_KEY, None)
     if conn is not None:
-        conn.close()
         if hasattr(g, _CONNECTION_KEY):
             delattr(g, _CONNECTION_KEY)
+        # Never hand the next app context a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        if conn.batch_depth:
+            conn.close()
+            return
+        try:
+            _writers().put_nowait(conn)
+        except queue.Full:
+            conn.close()
 
 
 @contextmanager
 def cursor() -> Iterator[sqlite3.Cursor]:
     """
-    Context manager yielding a SQLite cursor with automatic commit and retry logic.
+    Context manager yielding a SQLite cursor with automatic commit.
     
     This is a helper function that:
     - Gets a database cursor
     - Automatically commits when done (or rolls back on error)
-    - Retries if the database is locked (SQLite can only handle one writer at a time)
     - Cleans up the cursor when done
     
+    If the database is locked (SQLite only allows one writer at a time), SQLite
+    itself waits for up to busy_timeout before raising - see _CONNECTION_PRAGMAS.
+    
+    Inside a batch() block the commit (or rollback) is left to the batch, so any
+    number of helpers built on cursor() share that one transaction.
+    
     Usage:
         with cursor() as cur:
             cur.execute("SELECT * FROM users")
             rows = cur.fetchall()
     """
-    import time
-    max_retries = 3
-    retry_count = 0
-    conn = None
-    cur = None
-    
+    conn = get_connection()
+    in_batch = conn.batch_depth > 0
+    cur = conn.cursor()
     try:
-        while retry_count < max_retries:
-            conn = None
-            cur = None
-            try:
-                conn = get_connection()
-                cur = conn.cursor()
-                yield cur  # Give the cursor to the caller
-                conn.commit()  # Save changes
-                break  # Success, exit retry loop
-            except sqlite3.OperationalError as e:
-                # Database is locked - another thread is using it
-                if cur:
-                    try:
-                        cur.close()
-                    except Exception:
-                        pass
-                if conn:
-                    try:
-                        conn.rollback()  # Undo any changes
-                    except Exception:
-                        pass
-                if "database is locked" in str(e).lower() and retry_count < max_retries - 1:
-                    # Retry with exponential backoff (wait longer each time)
-                    retry_count += 1
-                    time.sleep(0.1 * retry_count)  # Wait 0.1s, 0.2s, 0.3s
-                    continue
-                else:
-                    # Give up and raise the error
-                    raise
-            except Exception:
-                # Any other error - roll back and re-raise
-                if cur:
-                    try:
-                        cur.close()
-                    except Exception:
-                        pass
-                if conn:
-                    try:
-                        conn.rollback()
-                    except Exception:
-                        pass
-                raise
-    finally:
-        # Clean up cursor if it still exists
-        if cur:
+        yield cur  # Give the cursor to the caller
+        if not in_batch:
+            conn.commit()  # Save changes
+    except Exception:
+        # Undo any changes and re-raise
+        if not in_batch:
             try:
-                cur.close()
+                conn.rollback()
             except Exception:
                 pass
+        raise
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+
+
+@contextmanager
+def batch() -> Iterator[sqlite3.Connection]:
+    """
+    Run several writes as one transaction (one commit, one fsync).
+    
+    Every cursor()-based helper called inside the block joins the transaction
+    instead of committing on its own; it's committed when the outermost block
+    exits and rolled back if it raises. The write lock is taken up front
+    (BEGIN IMMEDIATE), so a batch never fails halfway through upgrading a read.
+    
+    Usage:
+        with batch():
+            create_classifications_bulk(rows)
+            create_meeting(...)
+    """
+    conn = get_connection()
+    outer = conn.batch_depth == 0
+    if outer and not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    conn.batch_depth += 1
+    try:
+        yield conn
+        if outer:
+            conn.commit()
+    except BaseException:
+        if outer:
+            conn.rollback()
+        raise
+    finally:
+        conn.batch_depth -= 1
 
 
 def remove_duplicates() -> None:
     """Remove duplicate entries from emails, meetings, tasks, and unsubscribe_entries tables."""
-    conn = get_connection()
-    
-    # Remove duplicate emails, keeping the most recent one (by created_at or id)
-    # First, delete classifications, meetings, tasks, and unsubscribe entries for duplicate emails
-    conn.execute("""
-        DELETE FROM classifications
-        WHERE email_id IN (
-            SELECT id FROM emails
-            WHERE id NOT IN (
-                SELECT MIN(id) 
-                FROM emails 
-                GROUP BY user_id, gmail_message_id
+    # Everything below is one transaction: one fsync, and no reader ever sees
+    # child rows deleted while their duplicate email is still there
+    with batch() as conn:
+        # Find duplicate emails once, keeping the first one stored (lowest id) of each
+        # (user_id, gmail_message_id). Every delete below reuses this list instead of
+        # re-running the GROUP BY over the whole emails table.
+        conn.execute("DROP TABLE IF EXISTS temp.duplicate_email_ids")
+        conn.execute("""
+            CREATE TEMP TABLE duplicate_email_ids AS
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, gmail_message_id ORDER BY id
+                ) AS position
+                FROM emails
             )
-        )
-    """)
-    
-    conn.execute("""
-        DELETE FROM meetings
-        WHERE email_id IN (
-            SELECT id FROM emails
+            WHERE position > 1
+        """)
+        
+        # First, delete classifications, meetings, tasks, and unsubscribe entries for duplicate emails
+        has_duplicates = conn.execute("SELECT 1 FROM duplicate_email_ids LIMIT 1").fetchone()
+        if has_duplicates:
+            for table in ("classifications", "meetings", "tasks", "unsubscribe_entries"):
+                conn.execute(
+                    f"DELETE FROM {table} WHERE email_id IN (SELECT id FROM duplicate_email_ids)"
+                )
+            # Now remove duplicate emails themselves
+            conn.execute("DELETE FROM emails WHERE id IN (SELECT id FROM duplicate_email_ids)")
+        conn.execute("DROP TABLE temp.duplicate_email_ids")
+        
+        # Remove duplicate meetings, keeping the most recent one
+        conn.execute("""
+            DELETE FROM meetings
             WHERE id NOT IN (
                 SELECT MIN(id) 
-                FROM emails 
-                GROUP BY user_id, gmail_message_id
+                FROM meetings 
+                GROUP BY email_id
             )
-        )
-    """)
-    
-    conn.execute("""
-        DELETE FROM tasks
-        WHERE email_id IN (
-            SELECT id FROM emails
+        """)
+        
+        # Remove duplicate tasks, keeping the most recent one
+        conn.execute("""
+            DELETE FROM tasks
             WHERE id NOT IN (
                 SELECT MIN(id) 
-                FROM emails 
-                GROUP BY user_id, gmail_message_id
+                FROM tasks 
+                GROUP BY email_id
             )
-        )
-    """)
-    
-    conn.execute("""
-        DELETE FROM unsubscribe_entries
-        WHERE email_id IN (
-            SELECT id FROM emails
+        """)
+        
+        # Remove duplicate unsubscribe entries, keeping the most recent one
+        conn.execute("""
+            DELETE FROM unsubscribe_entries
             WHERE id NOT IN (
                 SELECT MIN(id) 
-                FROM emails 
-                GROUP BY user_id, gmail_message_id
+                FROM unsubscribe_entries 
+                GROUP BY email_id
             )
-        )
-    """)
-    
-    # Now remove duplicate emails themselves, keeping the most recent one
-    conn.execute("""
-        DELETE FROM emails
-        WHERE id NOT IN (
-            SELECT MIN(id) 
-            FROM emails 
-            GROUP BY user_id, gmail_message_id
-        )
-    """)
-    
-    # Remove duplicate meetings, keeping the most recent one
-    conn.execute("""
-        DELETE FROM meetings
-        WHERE id NOT IN (
-            SELECT MIN(id) 
-            FROM meetings 
-            GROUP BY email_id
-        )
-    """)
-    
-    # Remove duplicate tasks, keeping the most recent one
-    conn.execute("""
-        DELETE FROM tasks
-        WHERE id NOT IN (
-            SELECT MIN(id) 
-            FROM tasks 
-            GROUP BY email_id
-        )
-    """)
-    
-    # Remove duplicate unsubscribe entries, keeping the most recent one
-    conn.execute("""
-        DELETE FROM unsubscribe_entries
-        WHERE id NOT IN (
-            SELECT MIN(id) 
-            FROM unsubscribe_entries 
-            GROUP BY email_id
-        )
-    """)
-    
-    conn.commit()
+        """)
 
 
 def create_tables() -> None:
     """Create all tables defined in `DDL_STATEMENTS`. Safe to call repeatedly."""
     conn = get_connection()
-    for statement in DDL_STATEMENTS:
-        conn.execute(statement)
-    conn.commit()
-    
-    # Add hidden column to emails table if it doesn't exist (migration)
+    # Enable WAL mode for better concurrency (allows multiple readers and one writer).
+    # It's persistent, so setting it here covers every later connection to the file
     try:
-        conn.execute("ALTER TABLE emails ADD COLUMN hidden INTEGER DEFAULT 0")
-        conn.commit()
+        conn.execute("PRAGMA journal_mode = WAL;")
     except sqlite3.OperationalError:
-        # Column already exists or table doesn't exist yet
+        # WAL mode might not be available in some SQLite versions, continue without it
         pass
+    # Everything below runs as one transaction. sqlite3 doesn't open one implicitly
+    # for DDL, so each CREATE/ALTER used to commit (and fsync) on its own. A failing
+    # ALTER only rolls back its own statement, so the try/except migrations still work.
+    with batch():
+        for statement in DDL_STATEMENTS:
+            conn.execute(statement)
+        
+        # Add hidden column to emails table if it doesn't exist (migration)
+        try:
+            conn.execute("ALTER TABLE emails ADD COLUMN hidden INTEGER DEFAULT 0")
+        except sqlite3.OperationalError:
+            # Column already exists or table doesn't exist yet
+            pass
+        
+        # Add is_self_sent column (migration). Rows stored before it existed are
+        # backfilled with the same case-insensitive substring test _is_self_sent() uses,
+        # including its "no user email -> not self-sent" rule (instr(x, '') is 1)
+        try:
+            conn.execute("ALTER TABLE emails ADD COLUMN is_self_sent INTEGER DEFAULT 0")
+            conn.execute(
+                """
+                UPDATE emails SET is_self_sent = 1
+                WHERE COALESCE((SELECT email FROM users WHERE users.id = emails.user_id), '') != ''
+                  AND instr(
+                    lower(COALESCE(sender, '')),
+                    lower((SELECT email FROM users WHERE users.id = emails.user_id))
+                  ) > 0
+                """
+            )
+        except sqlite3.OperationalError:
+            # Column already exists or table doesn't exist yet
+            pass
+        
+        # Add body_checked column (migration): set once the body backfill has tried a
+        # row, so rows with no extractable text aren't re-parsed on every sync
+        try:
+            conn.execute("ALTER TABLE emails ADD COLUMN body_checked INTEGER DEFAULT 0")
+        except sqlite3.OperationalError:
+            # Column already exists or table doesn't exist yet
+            pass
+        
+        # classification_cache used to keep a hit counter nothing read, and to persist
+        # "other" results - mostly one-off personal mail. Drop both (DROP COLUMN needs
+        # SQLite 3.35+; on older versions the unused column just stays)
+        try:
+            conn.execute("ALTER TABLE classification_cache DROP COLUMN hits")
+        except sqlite3.OperationalError:
+            # Column already gone, or SQLite too old to drop it
+            pass
+        conn.execute("DELETE FROM classification_cache WHERE category NOT IN ('junk', 'newsletter')")
+        # Lets touch_cached_classifications find stale cache rows without a table scan
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_classification_cache_last_used "
+            "ON classification_cache(last_used)"
+        )
+        
+        # Remove any existing duplicates before adding constraints
+        try:
+            remove_duplicates()
+        except sqlite3.OperationalError:
+            # Tables might not exist yet
+            pass
+        
+        # Add UNIQUE constraints to existing tables if they don't exist
+        try:
+            # Ensure unique constraint on emails (user_id, gmail_message_id)
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_emails_user_gmail_id ON emails(user_id, gmail_message_id)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_meetings_email_id ON meetings(email_id)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_email_id ON tasks(email_id)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_unsubscribe_email_id ON unsubscribe_entries(email_id)")
+        except sqlite3.OperationalError:
+            # Constraints might already exist or table might not exist yet
+            pass
+        
+        # Every list query filters emails by user and sorts newest first. Without this,
+        # SQLite reads all of the user's rows and sorts them in a temp b-tree per request;
+        # with it, it walks the index in order and LIMIT can stop early.
+        # (Category filters are already covered by the UNIQUE (email_id, category) index.)
+        # `hidden` rides along at the end so the hidden filter - and, with the
+        # classifications index, fetch_unclassified_emails' NOT EXISTS probe - is answered
+        # from the index without reading each email row (bodies + raw_json) first.
+        conn.execute("DROP INDEX IF EXISTS idx_emails_user_date")  # superseded by the one below
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_emails_user_date_hidden "
+            "ON emails(user_id, date DESC, created_at DESC, hidden)"
+        )
+        # List queries filter out self-sent mail with an equality on is_self_sent, so
+        # they can seek straight to the user's incoming, visible emails in date order
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_emails_user_selfsent_date "
+            "ON emails(user_id, is_self_sent, hidden, date DESC)"
+        )
+        # The junk list probes classifications for just these two categories. A partial
+        # index holds only those rows, so the probes touch far fewer pages than the full
+        # UNIQUE (email_id, category) index. SQLite only uses it when the query repeats
+        # this exact IN list, so keep iter_junk_emails' filter in sync with it.
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_classifications_junk "
+            "ON classifications(email_id, category) WHERE category IN ('junk', 'newsletter')"
+        )
+        # Give the query planner statistics the first time round; after that they're
+        # only refreshed by PRAGMA optimize / manual ANALYZE, not on every startup
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        ).fetchone()
+        if not has_stats:
+            conn.execute("ANALYZE")
+
+
+def get_user_data_version(user_id: int) -> int:
+    """Return a number that changes whenever any of the user's email data changes."""
+    with reader() as conn:
+        row = conn.execute(
+            "SELECT version FROM user_data_versions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row["version"] if row else 0
+
+
+def try_acquire_lock(name: str, ttl_seconds: float) -> bool:
+    """
+    Atomically take a named lease, returning False if someone else holds it.
     
-    # Remove any existing duplicates before adding constraints
-    try:
-        remove_duplicates()
-    except sqlite3.OperationalError:
-        # Tables might not exist yet
-        pass
+    The lease lives in SQLite, so it's visible to every gunicorn worker process,
+    not just the threads of the current one. Leases expire after ttl_seconds so a
+    crashed worker can't block a user forever.
+    """
+    now = time.time()
+    with cursor() as cur:
+        # Both statements run in one write transaction, so only one caller can win
+        cur.execute(
+            "DELETE FROM processing_locks WHERE name = ? AND expires_at <= ?",
+            (name, now),
+        )
+        cur.execute(
+            "INSERT OR IGNORE INTO processing_locks (name, expires_at) VALUES (?, ?)",
+            (name, now + ttl_seconds),
+        )
+        acquired = cur.rowcount == 1
+    return acquired
+
+
+def release_lock(name: str) -> None:
+    """Release a lease taken with try_acquire_lock()."""
+    with cursor() as cur:
+        cur.execute("DELETE FROM processing_locks WHERE name = ?", (name,))
+
+
+def save_oauth_state(sid: str, state: str, ttl_seconds: float) -> None:
+    """Remember the OAuth state for a login started by the browser holding cookie `sid`."""
+    now = time.time()
+    with cursor() as cur:
+        # Abandoned logins never reach the callback, so sweep expired ones here
+        cur.execute("DELETE FROM oauth_states WHERE expires_at <= ?", (now,))
+        cur.execute(
+            "INSERT OR REPLACE INTO oauth_states (sid, state, expires_at) VALUES (?, ?, ?)",
+            (sid, state, now + ttl_seconds),
+        )
+
+
+def pop_oauth_state(sid: str) -> Optional[str]:
+    """
+    Return and delete the OAuth state stored for `sid`.
     
-    # Add UNIQUE constraints to existing tables if they don't exist
-    try:
-        # Ensure unique constraint on emails (user_id, gmail_message_id)
-        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_emails_user_gmail_id ON emails(user_id, gmail_message_id)")
-        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_meetings_email_id ON meetings(email_id)")
-        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_email_id ON tasks(email_id)")
-        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_unsubscribe_email_id ON unsubscribe_entries(email_id)")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Constraints might already exist or table might not exist yet
-        pass
+    Returns None if there is none, it expired, or another request already used it -
+    a state can only be consumed once, which stops replayed callbacks.
+    """
+    with cursor() as cur:
+        cur.execute("SELECT state, expires_at FROM oauth_states WHERE sid = ?", (sid,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        cur.execute("DELETE FROM oauth_states WHERE sid = ?", (sid,))
+        # Only the request whose DELETE removed the row gets to use the state
+        consumed = cur.rowcount == 1
+    if not consumed or row["expires_at"] <= time.time():
+        return None
+    return row["state"]
 
 
 def clear_all_data() -> None:
@@ -391,11 +766,18 @@ def clear_all_data() -> None:
     conn.execute("DELETE FROM emails")
     conn.execute("DELETE FROM credentials")
     conn.execute("DELETE FROM users")
+    conn.execute("DELETE FROM classification_cache")
     conn.commit()
 
 
 def clear_user_data(user_id: int) -> None:
-    """Clear all data for a specific user. Use with caution!"""
+    """
+    Clear all data for a specific user. Use with caution!
+    
+    classification_cache is left alone: it's shared by all users and keyed by a hash
+    of the email's content, not by user. It only holds junk/newsletter results, and
+    rows age out after CLASSIFICATION_CACHE_MAX_AGE_DAYS without use.
+    """
     conn = get_connection()
     # Delete in order to respect foreign key constraints
     conn.execute("DELETE FROM unsubscribe_entries WHERE email_id IN (SELECT id FROM emails WHERE user_id = ?)", (user_id,))
@@ -424,36 +806,67 @@ def init_app(app) -> None:
     # before_first_request is deprecated in Flask 3.0+
 
 
+def _utc_now_iso() -> str:
+    """
+    Current UTC time as a naive ISO-8601 string, the format created_at columns use.
+    
+    Same value datetime.utcnow().isoformat() gave (utcnow() is deprecated), so new
+    rows still sort correctly against existing ones when created_at breaks ties.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+
 # ---------------------------------------------------------------------------
 # User helpers
 # ---------------------------------------------------------------------------
 
 def create_user(google_user_id: str, email: str) -> Dict[str, Any]:
     with cursor() as cur:
-        cur.execute(
+        row = cur.execute(
             """
             INSERT INTO users (google_user_id, email, created_at)
             VALUES (?, ?, ?)
             ON CONFLICT(google_user_id) DO UPDATE SET email=excluded.email
+            RETURNING *
             """,
-            (google_user_id, email, datetime.utcnow().isoformat()),
-        )
-    return get_user_by_google_id(google_user_id)  # type: ignore[return-value]
+            (google_user_id, email, _utc_now_iso()),
+        ).fetchone()
+    return dict(row)
 
 
 def get_user_by_google_id(google_user_id: str) -> Optional[Dict[str, Any]]:
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT * FROM users WHERE google_user_id = ?",
-        (google_user_id,),
-    ).fetchone()
-    return dict(row) if row else None
+    with reader() as conn:
+        row = conn.execute(
+            "SELECT * FROM users WHERE google_user_id = ?",
+            (google_user_id,),
+        ).fetchone()
+        return dict(row) if row else None
 
 
 def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
-    conn = get_connection()
-    row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
-    return dict(row) if row else None
+    with reader() as conn:
+        row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        return dict(row) if row else None
+
+
+def get_user_email(user_id: int) -> Optional[str]:
+    """
+    Return a user's email address, querying it at most once per app context.
+    
+    Storing emails looks it up to flag self-sent mail (see _is_self_sent), so a
+    request that stores several emails only reads the users row once. The memo
+    lives on `g`, so it is dropped with the app context - one request or one
+    background job - rather than kept for the life of the process.
+    """
+    try:
+        memo = g.setdefault(_USER_EMAILS_KEY, {})
+    except RuntimeError:
+        # No Flask application context - nothing to memoize on
+        memo = {}
+    if user_id not in memo:
+        user = get_user_by_id(user_id)
+        memo[user_id] = user.get("email") if user else None
+    return memo[user_id]
 
 
 def get_or_create_user(google_user_id: str, email: str) -> Dict[str, Any]:
@@ -474,7 +887,7 @@ def upsert_credentials(
     token_expiry: Optional[str],
 ) -> Dict[str, Any]:
     with cursor() as cur:
-        cur.execute(
+        row = cur.execute(
             """
             INSERT INTO credentials (user_id, access_token, refresh_token, token_expiry)
             VALUES (?, ?, ?, ?)
@@ -482,25 +895,38 @@ def upsert_credentials(
                 access_token=excluded.access_token,
                 refresh_token=excluded.refresh_token,
                 token_expiry=excluded.token_expiry
+            RETURNING *
             """,
             (user_id, access_token, refresh_token, token_expiry),
-        )
-    return get_credentials_for_user(user_id)  # type: ignore[return-value]
+        ).fetchone()
+    return dict(row)
 
 
 def get_credentials_for_user(user_id: int) -> Optional[Dict[str, Any]]:
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT * FROM credentials WHERE user_id = ?",
-        (user_id,),
-    ).fetchone()
-    return dict(row) if row else None
+    with reader() as conn:
+        row = conn.execute(
+            "SELECT * FROM credentials WHERE user_id = ?",
+            (user_id,),
+        ).fetchone()
+        return dict(row) if row else None
 
 
 # ---------------------------------------------------------------------------
 # Email + classification helpers
 # ---------------------------------------------------------------------------
 
+def _is_self_sent(user_email: Optional[str], sender: Optional[str]) -> int:
+    """
+    Return 1 if an email was sent by the user themselves, else 0.
+    
+    Computed once when the email is stored so list queries can filter on an
+    indexed column instead of running `sender NOT LIKE '%user@x%'` on every row.
+    """
+    if user_email and user_email.lower() in (sender or "").lower():
+        return 1
+    return 0
+
+
 def create_email(
     user_id: int,
     gmail_message_id: str,
@@ -512,20 +938,24 @@ def create_email(
     raw_json: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     payload_json = json.dumps(raw_json or {})
+    is_self_sent = _is_self_sent(get_user_email(user_id), sender)
     with cursor() as cur:
-        cur.execute(
+        row = cur.execute(
             """
             INSERT INTO emails (
-                user_id, gmail_message_id, sender, subject, date, body, snippet, raw_json, hidden, created_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?)
+                user_id, gmail_message_id, sender, subject, date, body, snippet, raw_json, hidden,
+                is_self_sent, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
             ON CONFLICT(user_id, gmail_message_id) DO UPDATE SET
                 sender=excluded.sender,
+                is_self_sent=excluded.is_self_sent,
                 subject=excluded.subject,
                 date=excluded.date,
                 body=excluded.body,
                 snippet=excluded.snippet,
                 raw_json=excluded.raw_json,
                 hidden=emails.hidden
+            RETURNING *
             """,
             (
                 user_id,
@@ -536,22 +966,97 @@ def create_email(
                 body,
                 snippet,
                 payload_json,
-                datetime.utcnow().isoformat(),
+                is_self_sent,
+                _utc_now_iso(),
             ),
+        ).fetchone()
+    return dict(row)
+
+
+def create_emails_bulk(
+    user_id: int,
+    emails: List[Dict[str, Any]],
+    user_email: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Insert or update many emails in a single transaction.
+    
+    Same upsert as create_email(), but the whole batch shares one commit (one fsync)
+    instead of paying for a commit and a re-read per email.
+    
+    Args:
+        user_id: Owner of the emails
+        emails: Dicts with gmail_message_id, sender, subject, date, body, snippet, raw_json
+        user_email: The user's own address, if the caller already has it; looked up otherwise
+        
+    Returns:
+        Mapping of gmail_message_id -> emails.id for every stored email
+    """
+    if not emails:
+        return {}
+    
+    created_at = _utc_now_iso()
+    if user_email is None:
+        user_email = get_user_email(user_id)
+    rows = [
+        (
+            user_id,
+            email["gmail_message_id"],
+            email.get("sender"),
+            email.get("subject"),
+            email.get("date"),
+            email.get("body"),
+            email.get("snippet"),
+            json.dumps(email.get("raw_json") or {}),
+            _is_self_sent(user_email, email.get("sender")),
+            created_at,
+        )
+        for email in emails
+    ]
+    message_ids = [row[1] for row in rows]
+    ids: Dict[str, int] = {}
+    with cursor() as cur:
+        cur.executemany(
+            """
+            INSERT INTO emails (
+                user_id, gmail_message_id, sender, subject, date, body, snippet, raw_json, hidden,
+                is_self_sent, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+            ON CONFLICT(user_id, gmail_message_id) DO UPDATE SET
+                sender=excluded.sender,
+                is_self_sent=excluded.is_self_sent,
+                subject=excluded.subject,
+                date=excluded.date,
+                body=excluded.body,
+                snippet=excluded.snippet,
+                raw_json=excluded.raw_json,
+                hidden=emails.hidden
+            """,
+            rows,
         )
-    return get_email_by_message_id(user_id, gmail_message_id)  # type: ignore[return-value]
+        # One statement for the whole batch, like get_existing_message_ids: the IDs go
+        # in as a single JSON array instead of an IN (?, ?, ...) list rebuilt per chunk
+        for row in cur.execute(
+            """
+            SELECT id, gmail_message_id FROM emails
+            WHERE user_id = ? AND gmail_message_id IN (SELECT value FROM json_each(?))
+            """,
+            (user_id, json.dumps(message_ids)),
+        ):
+            ids[row["gmail_message_id"]] = row["id"]
+    return ids
 
 
 def get_email_by_message_id(user_id: int, gmail_message_id: str) -> Optional[Dict[str, Any]]:
-    conn = get_connection()
-    row = conn.execute(
-        """
-        SELECT * FROM emails
-        WHERE user_id = ? AND gmail_message_id = ?
-        """,
-        (user_id, gmail_message_id),
-    ).fetchone()
-    return dict(row) if row else None
+    with reader() as conn:
+        row = conn.execute(
+            """
+            SELECT * FROM emails
+            WHERE user_id = ? AND gmail_message_id = ?
+            """,
+            (user_id, gmail_message_id),
+        ).fetchone()
+        return dict(row) if row else None
 
 
 def get_all_gmail_message_ids(user_id: int) -> List[str]:
@@ -559,22 +1064,25 @@ def get_all_gmail_message_ids(user_id: int) -> List[str]:
     
     NOTE: This loads all IDs into memory. For large inboxes, use get_existing_message_ids() instead.
     """
-    conn = get_connection()
-    rows = conn.execute(
-        """
-        SELECT gmail_message_id FROM emails
-        WHERE user_id = ? AND gmail_message_id IS NOT NULL
-        """,
-        (user_id,),
-    ).fetchall()
-    return [row["gmail_message_id"] for row in rows if row["gmail_message_id"]]
+    with reader() as conn:
+        rows = _plain_cursor(conn).execute(
+            """
+            SELECT gmail_message_id FROM emails
+            WHERE user_id = ? AND gmail_message_id IS NOT NULL
+            """,
+            (user_id,),
+        )
+        return [message_id for (message_id,) in rows if message_id]
 
 
 def get_existing_message_ids(user_id: int, message_ids: List[str]) -> List[str]:
     """Efficiently check which message IDs already exist in the database.
     
-    Uses a parameterized IN clause instead of loading all IDs into memory.
-    For large lists (>999 IDs), chunks the query (SQLite limit).
+    The candidates are passed as a single JSON array and unpacked with json_each(),
+    so any number of IDs is checked with one statement - SQLite's statement cache
+    reuses it across calls instead of parsing and planning a differently sized
+    IN (?, ?, ...) list for every 999-ID chunk. (A temp table would need writes,
+    which the read-only pooled connections refuse.)
     
     Args:
         user_id: User ID to check
@@ -586,103 +1094,243 @@ def get_existing_message_ids(user_id: int, message_ids: List[str]) -> List[str]:
     if not message_ids:
         return []
     
-    conn = get_connection()
-    existing: List[str] = []
-    
-    # SQLite supports up to 999 parameters in a query
-    # Chunk the query if we have more than 999 IDs
-    chunk_size = 999
-    for i in range(0, len(message_ids), chunk_size):
-        chunk = message_ids[i:i + chunk_size]
-        placeholders = ",".join("?" * len(chunk))
-        rows = conn.execute(
-            f"""
+    with reader() as conn:
+        rows = _plain_cursor(conn).execute(
+            """
             SELECT gmail_message_id FROM emails
-            WHERE user_id = ? AND gmail_message_id IN ({placeholders})
+            WHERE user_id = ? AND gmail_message_id IN (SELECT value FROM json_each(?))
             """,
-            (user_id, *chunk),
-        ).fetchall()
-        existing.extend([row["gmail_message_id"] for row in rows if row["gmail_message_id"]])
-    
-    return existing
+            (user_id, json.dumps(message_ids)),
+        )
+        return [message_id for (message_id,) in rows if message_id]
 
 
 def get_email_by_id(email_id: int) -> Optional[Dict[str, Any]]:
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT * FROM emails WHERE id = ?",
-        (email_id,),
-    ).fetchone()
-    return dict(row) if row else None
+    with reader() as conn:
+        row = conn.execute(
+            "SELECT * FROM emails WHERE id = ?",
+            (email_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+
+def get_emails_by_ids(email_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Return the rows for many email IDs with one query, keyed by ID.
+    
+    The batch counterpart of get_email_by_id(); IDs are passed as one JSON array
+    (see get_existing_message_ids). Missing IDs are simply absent from the result.
+    """
+    if not email_ids:
+        return {}
+    
+    with reader() as conn:
+        return {
+            email["id"]: email
+            for email in _iter_dicts(
+                conn,
+                "SELECT * FROM emails WHERE id IN (SELECT value FROM json_each(?))",
+                [json.dumps(email_ids)],
+            )
+        }
 
 
 def email_exists_by_message_id(user_id: int, message_id: str) -> bool:
     """Check if an email with the given Gmail message ID exists for the user."""
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT 1 FROM emails WHERE user_id = ? AND gmail_message_id = ? LIMIT 1",
-        (user_id, message_id),
-    ).fetchone()
-    return row is not None
+    with reader() as conn:
+        row = conn.execute(
+            "SELECT 1 FROM emails WHERE user_id = ? AND gmail_message_id = ? LIMIT 1",
+            (user_id, message_id),
+        ).fetchone()
+        return row is not None
 
 
 def get_most_recent_email_date(user_id: int) -> Optional[str]:
     """Get the date of the most recently synced email for a user."""
-    conn = get_connection()
-    row = conn.execute(
-        """
-        SELECT date FROM emails
-        WHERE user_id = ?
-        ORDER BY date DESC NULLS LAST, created_at DESC
-        LIMIT 1
-        """,
-        (user_id,),
-    ).fetchone()
-    return row["date"] if row and row["date"] else None
+    with reader() as conn:
+        row = conn.execute(
+            """
+            SELECT date FROM emails
+            WHERE user_id = ?
+            ORDER BY date DESC NULLS LAST, created_at DESC
+            LIMIT 1
+            """,
+            (user_id,),
+        ).fetchone()
+        return row["date"] if row and row["date"] else None
 
 
 def get_sync_stats(user_id: int) -> Dict[str, Any]:
     """Get sync statistics: total emails, processed count, unprocessed count."""
-    conn = get_connection()
-    total = conn.execute(
-        "SELECT COUNT(*) AS count FROM emails WHERE user_id = ? AND (hidden IS NULL OR hidden = 0)",
-        (user_id,),
-    ).fetchone()["count"]
+    with reader() as conn:
+        # One pass over the user's visible emails counts both. "Processed" probes the
+        # classifications index per email rather than joining, so an email with more
+        # than one classification row is still counted once without a DISTINCT sort.
+        row = conn.execute(
+            """
+            SELECT
+                COUNT(*) AS total,
+                COALESCE(SUM(EXISTS (
+                    SELECT 1 FROM classifications WHERE classifications.email_id = emails.id
+                )), 0) AS processed
+            FROM emails
+            WHERE user_id = ? AND (hidden IS NULL OR hidden = 0)
+            """,
+            (user_id,),
+        ).fetchone()
+        total = row["total"]
+        processed = row["processed"]
+        
+        return {
+            "total_emails": total,
+            "processed_emails": processed,
+            "unprocessed_emails": total - processed,
+        }
+
+
+def get_sync_context(user_id: int) -> Dict[str, Any]:
+    """
+    Return everything a sync looks up before talking to Gmail, in one query.
     
-    processed = conn.execute(
-        """
-        SELECT COUNT(DISTINCT classifications.email_id) AS count
-        FROM classifications
-        JOIN emails ON emails.id = classifications.email_id
-        WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
-        """,
-        (user_id,),
-    ).fetchone()["count"]
+    Combines get_sync_stats(), get_most_recent_email_date(), the user's email and
+    whether they have stored credentials, which used to be four separate reads.
     
-    return {
-        "total_emails": total,
-        "processed_emails": processed,
-        "unprocessed_emails": total - processed,
-    }
+    Returns:
+        Dict with user_email, has_credentials, most_recent_date and the
+        get_sync_stats() counters
+    """
+    with reader() as conn:
+        row = conn.execute(
+            """
+            SELECT
+                (SELECT email FROM users WHERE id = ?) AS user_email,
+                EXISTS (SELECT 1 FROM credentials WHERE user_id = ?) AS has_credentials,
+                (SELECT date FROM emails
+                 WHERE user_id = ?
+                 ORDER BY date DESC NULLS LAST, created_at DESC
+                 LIMIT 1
+                ) AS most_recent_date,
+                stats.total,
+                stats.processed
+            FROM (
+                SELECT
+                    COUNT(*) AS total,
+                    COALESCE(SUM(EXISTS (
+                        SELECT 1 FROM classifications WHERE classifications.email_id = emails.id
+                    )), 0) AS processed
+                FROM emails
+                WHERE user_id = ? AND (hidden IS NULL OR hidden = 0)
+            ) AS stats
+            """,
+            (user_id,) * 4,
+        ).fetchone()
+        total = row["total"]
+        processed = row["processed"]
+        
+        return {
+            "user_email": row["user_email"],
+            "has_credentials": bool(row["has_credentials"]),
+            "most_recent_date": row["most_recent_date"] or None,
+            "total_emails": total,
+            "processed_emails": processed,
+            "unprocessed_emails": total - processed,
+        }
 
 
 def fetch_unclassified_emails(user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
-    conn = get_connection()
-    rows = conn.execute(
-        """
-        SELECT *
-        FROM emails
-        WHERE user_id = ?
-          AND (hidden IS NULL OR hidden = 0)
-          AND NOT EXISTS (
-            SELECT 1 FROM classifications WHERE classifications.email_id = emails.id
-          )
-        ORDER BY date DESC NULLS LAST, created_at DESC
-        LIMIT ?
-        """,
-        (user_id, limit),
-    ).fetchall()
-    return [dict(row) for row in rows]
+    """
+    Return the newest unclassified emails with the columns the classifier reads.
+    
+    raw_json is still needed (unsubscribe headers live in it), but bookkeeping
+    columns like user_id, hidden and created_at are left behind.
+    """
+    with reader() as conn:
+        # Zipped onto plain tuples (see _iter_dicts) - the classifier only needs dicts
+        return list(_iter_dicts(
+            conn,
+            """
+            SELECT id, gmail_message_id, sender, subject, date, body, snippet, raw_json
+            FROM emails
+            WHERE user_id = ?
+              AND (hidden IS NULL OR hidden = 0)
+              AND NOT EXISTS (
+                SELECT 1 FROM classifications WHERE classifications.email_id = emails.id
+              )
+            ORDER BY date DESC NULLS LAST, created_at DESC
+            LIMIT ?
+            """,
+            [user_id, limit],
+        ))
+
+
+def fetch_unclassified_email_ids(user_id: int, limit: int = 50) -> List[int]:
+    """
+    Return just the IDs of the newest unclassified emails.
+    
+    For callers that only hand the IDs on (e.g. to a ClassificationJob). Every column
+    it touches is in idx_emails_user_date_hidden or the classifications index, so
+    no email row - body and raw_json included - is read at all.
+    """
+    with reader() as conn:
+        rows = conn.execute(
+            """
+            SELECT id
+            FROM emails
+            WHERE user_id = ?
+              AND (hidden IS NULL OR hidden = 0)
+              AND NOT EXISTS (
+                SELECT 1 FROM classifications WHERE classifications.email_id = emails.id
+              )
+            ORDER BY date DESC NULLS LAST, created_at DESC
+            LIMIT ?
+            """,
+            (user_id, limit),
+        ).fetchall()
+        return [row["id"] for row in rows]
+
+
+def fetch_emails_missing_body(
+    user_id: int, after_id: int = 0, limit: int = 500
+) -> List[Dict[str, Any]]:
+    """
+    Return id + raw_json for emails stored without a body that the backfill hasn't tried.
+    
+    Older syncs didn't always extract the body, so these rows only have the raw Gmail
+    payload. Used by the body backfill in services.gmail_sync, which pages through
+    them in id order by passing the last id it saw as after_id.
+    """
+    with reader() as conn:
+        return list(_iter_dicts(
+            conn,
+            """
+            SELECT id, raw_json
+            FROM emails
+            WHERE user_id = ?
+              AND id > ?
+              AND (body IS NULL OR TRIM(body) = '')
+              AND (body_checked IS NULL OR body_checked = 0)
+              AND raw_json IS NOT NULL AND raw_json != '{}'
+            ORDER BY id
+            LIMIT ?
+            """,
+            [user_id, after_id, limit],
+        ))
+
+
+def update_email_bodies(bodies: List[Tuple[int, Optional[str]]]) -> None:
+    """
+    Persist extracted bodies, given as (email_id, body) pairs, in one transaction.
+    
+    Every row passed is marked body_checked; a None or empty body leaves the stored
+    body as it is, so rows with nothing to extract aren't tried again.
+    """
+    if not bodies:
+        return
+    with cursor() as cur:
+        cur.executemany(
+            "UPDATE emails SET body = COALESCE(NULLIF(?, ''), body), body_checked = 1 WHERE id = ?",
+            [(body, email_id) for email_id, body in bodies],
+        )
 
 
 def hide_email(user_id: int, email_id: int) -> None:
@@ -701,240 +1349,321 @@ def create_classification(
     confidence: float,
 ) -> Dict[str, Any]:
     with cursor() as cur:
-        cur.execute(
+        row = cur.execute(
             """
             INSERT INTO classifications (email_id, category, confidence)
             VALUES (?, ?, ?)
             ON CONFLICT(email_id, category) DO UPDATE SET
                 confidence=excluded.confidence,
                 created_at=CURRENT_TIMESTAMP
+            RETURNING *
             """,
             (email_id, category, confidence),
+        ).fetchone()
+    return dict(row)
+
+
+def create_classifications_bulk(rows: List[Tuple[int, str, float]]) -> None:
+    """Insert or update many (email_id, category, confidence) classifications in one transaction."""
+    if not rows:
+        return
+    with cursor() as cur:
+        cur.executemany(
+            """
+            INSERT INTO classifications (email_id, category, confidence)
+            VALUES (?, ?, ?)
+            ON CONFLICT(email_id, category) DO UPDATE SET
+                confidence=excluded.confidence,
+                created_at=CURRENT_TIMESTAMP
+            """,
+            rows,
         )
-    return get_classification_for_email(email_id, category)  # type: ignore[return-value]
 
 
 def get_classification_for_email(email_id: int, category: str) -> Optional[Dict[str, Any]]:
-    conn = get_connection()
-    row = conn.execute(
-        """
-        SELECT * FROM classifications
-        WHERE email_id = ? AND category = ?
-        """,
-        (email_id, category),
-    ).fetchone()
-    return dict(row) if row else None
+    with reader() as conn:
+        row = conn.execute(
+            """
+            SELECT * FROM classifications
+            WHERE email_id = ? AND category = ?
+            """,
+            (email_id, category),
+        ).fetchone()
+        return dict(row) if row else None
 
 
-def fetch_emails_with_categories(user_id: int) -> List[Dict[str, Any]]:
-    conn = get_connection()
-    # Get user's email to filter out self-sent emails
-    user = get_user_by_id(user_id)
-    user_email = user.get("email") if user else None
-    
-    query = """
-        SELECT emails.id, emails.subject, emails.snippet, emails.date, classifications.category
-        FROM emails
-        JOIN classifications ON classifications.email_id = emails.id
-        WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
+def get_cached_classification(key: str) -> Optional[Dict[str, Any]]:
     """
-    params: List[Any] = [user_id]
-    
-    # Exclude emails sent by the user (only show incoming emails)
-    if user_email:
-        query += " AND (emails.sender IS NULL OR emails.sender NOT LIKE ?)"
-        params.append(f"%{user_email}%")
+    Return the stored OpenAI result for a classification cache key, or None.
     
-    query += " ORDER BY emails.date DESC NULLS LAST, emails.created_at DESC"
-    rows = conn.execute(query, params).fetchall()
-    return [dict(row) for row in rows]
+    Read-only on purpose: it runs on the classifier's parallel analysis threads, and
+    bumping last_used here took the write lock and committed on every cache hit,
+    contending with the batch writes of store_analyses() and the sync. Hits are
+    recorded later, in bulk, by touch_cached_classifications().
+    """
+    with reader() as conn:
+        row = conn.execute(
+            "SELECT result_json FROM classification_cache WHERE hash = ?",
+            (key,),
+        ).fetchone()
+    if row is None:
+        return None
+    return json.loads(row["result_json"])
 
 
-def fetch_meetings(user_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-    conn = get_connection()
-    # Get user's email to filter out self-sent emails
-    user = get_user_by_id(user_id)
-    user_email = user.get("email") if user else None
+def store_cached_classification(key: str, result: Dict[str, Any]) -> None:
+    """Remember an OpenAI result under its cache key (first writer wins)."""
+    with cursor() as cur:
+        cur.execute(
+            """
+            INSERT OR IGNORE INTO classification_cache (hash, category, confidence, result_json, last_used)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                key,
+                str(result.get("category") or "").lower(),
+                float(result.get("confidence") or 0.0),
+                json.dumps(result),
+                _utc_now_iso(),
+            ),
+        )
+
+
+def touch_cached_classifications(keys: Iterable[str]) -> None:
+    """
+    Mark classification cache entries as used now, and prune ones unused for too long.
     
-    query = """
-        SELECT DISTINCT meetings.id, meetings.email_id, meetings.title, meetings.start_time, 
-               meetings.end_time, meetings.location, meetings.attendees_json, meetings.confidence,
-               emails.subject, emails.sender, emails.gmail_message_id, emails.date AS email_date,
-               emails.body, emails.snippet, emails.raw_json,
-               unsubscribe_entries.unsubscribe_url
-        FROM meetings
-        JOIN emails ON emails.id = meetings.email_id
-        LEFT JOIN unsubscribe_entries ON unsubscribe_entries.email_id = emails.id
-        WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
-    """
-    params: List[Any] = [user_id]
+    Called once per classified batch with the keys it was served from cache, so
+    keeping last_used current costs one executemany rather than a write per hit.
+    """
+    now = _utc_now_iso()
+    cutoff = (datetime.fromisoformat(now) - timedelta(days=CLASSIFICATION_CACHE_MAX_AGE_DAYS)).isoformat()
+    with cursor() as cur:
+        cur.executemany(
+            "UPDATE classification_cache SET last_used = ? WHERE hash = ?",
+            [(now, key) for key in keys],
+        )
+        cur.execute("DELETE FROM classification_cache WHERE last_used < ?", (cutoff,))
+
+
+def fetch_emails_with_categories(user_id: int) -> List[Tuple[Any, ...]]:
+    return list(iter_emails_with_categories(user_id))
+
+
+def iter_emails_with_categories(user_id: int) -> Iterator[Tuple[Any, ...]]:
+    """
+    Yield (id, subject, snippet, date, category) tuples for a user's visible emails.
     
-    # Exclude emails sent by the user (only show incoming emails)
-    if user_email:
-        query += " AND (emails.sender IS NULL OR emails.sender NOT LIKE ?)"
-        params.append(f"%{user_email}%")
+    This covers the whole inbox (there's no LIMIT), so rows come straight off the
+    cursor rather than being collected into a list that lives alongside whatever
+    the caller builds from them. The shape is fixed, so callers unpack the plain
+    tuples positionally instead of paying for a column-name lookup on a sqlite3.Row
+    for every field.
+    """
+    with reader() as conn:
+        query = """
+            SELECT emails.id, emails.subject, emails.snippet, emails.date, classifications.category
+            FROM emails
+            JOIN classifications ON classifications.email_id = emails.id
+            WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
+              AND emails.is_self_sent = 0  -- only show incoming emails
+        """
+        params: List[Any] = [user_id]
     
-    query += " ORDER BY emails.date DESC NULLS LAST, emails.created_at DESC"
-    if limit is not None:
-        query += " LIMIT ?"
-        params.append(limit)
-    rows = conn.execute(query, params).fetchall()
-    meetings: List[Dict[str, Any]] = []
-    for row in rows:
-        record = dict(row)
-        # Map email_date to date for consistency with frontend
-        if "email_date" in record:
-            record["date"] = record["email_date"]
-        attendees_payload = record.get("attendees_json")
-        if attendees_payload:
-            try:
-                record["attendees_json"] = json.loads(attendees_payload)
-            except json.JSONDecodeError:
-                record["attendees_json"] = {}
-        else:
-            record["attendees_json"] = {}
-        meetings.append(record)
-    return meetings
+        query += " ORDER BY emails.date DESC NULLS LAST, emails.created_at DESC"
+        yield from _plain_cursor(conn).execute(query, params)
 
 
-def fetch_tasks(user_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-    conn = get_connection()
-    # Get user's email to filter out self-sent emails
-    user = get_user_by_id(user_id)
-    user_email = user.get("email") if user else None
+def _plain_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """Return a cursor on conn that yields plain tuples instead of sqlite3.Row."""
+    cur = conn.cursor()
+    cur.row_factory = None
+    return cur
+
+
+def _iter_dicts(conn: sqlite3.Connection, query: str, params: List[Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield each result row as a plain dict.
     
-    query = """
-        SELECT DISTINCT tasks.id, tasks.email_id, tasks.description, tasks.due_date, 
-               tasks.status, tasks.confidence, emails.subject, emails.sender, emails.gmail_message_id,
-               emails.date, emails.body, emails.snippet, emails.raw_json,
-               unsubscribe_entries.unsubscribe_url
-        FROM tasks
-        JOIN emails ON emails.id = tasks.email_id
-        LEFT JOIN unsubscribe_entries ON unsubscribe_entries.email_id = emails.id
-        WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
-    """
-    params: List[Any] = [user_id]
+    The column names are read from the cursor once and zipped onto plain tuples,
+    which is cheaper than building a dict out of every sqlite3.Row.
+    """
+    cur = _plain_cursor(conn).execute(query, params)
+    columns = [description[0] for description in cur.description]
+    for row in cur:
+        yield dict(zip(columns, row))
+
+
+def _decode_attendees(payload: Optional[str]) -> Dict[str, Any]:
+    """Parse a stored attendees_json value, treating empty or corrupt values as {}."""
+    if not payload:
+        return {}
+    try:
+        return json.loads(payload)
+    except json.JSONDecodeError:
+        return {}
+
+
+# Item columns selected by the meeting and task lists (see _iter_email_items)
+_MEETING_COLUMNS = (
+    "id", "email_id", "title", "start_time", "end_time", "location", "attendees_json", "confidence",
+)
+_TASK_COLUMNS = ("id", "email_id", "description", "due_date", "status", "confidence")
+
+
+def _iter_email_items(
+    table: str,
+    columns: Tuple[str, ...],
+    user_id: int,
+    limit: Optional[int],
+    date_as: str = "date",
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield rows of an email-derived item table (meetings or tasks) with their email.
     
-    # Exclude emails sent by the user (only show incoming emails)
-    if user_email:
-        query += " AND (emails.sender IS NULL OR emails.sender NOT LIKE ?)"
-        params.append(f"%{user_email}%")
+    Both lists join the same email fields and unsubscribe URL and apply the same
+    visibility filters; only the item table and its columns differ. `table` and
+    `columns` come from the constants above, never from request input.
+    """
+    item_columns = ", ".join(f"{table}.{column}" for column in columns)
+    with reader() as conn:
+        query = f"""
+            SELECT DISTINCT {item_columns},
+                   emails.subject, emails.sender, emails.gmail_message_id, emails.date AS {date_as},
+                   emails.body, emails.snippet, emails.raw_json,
+                   unsubscribe_entries.unsubscribe_url
+            FROM {table}
+            JOIN emails ON emails.id = {table}.email_id
+            LEFT JOIN unsubscribe_entries ON unsubscribe_entries.email_id = emails.id
+            WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
+              AND emails.is_self_sent = 0  -- only show incoming emails
+        """
+        params: List[Any] = [user_id]
+        
+        query += " ORDER BY emails.date DESC NULLS LAST, emails.created_at DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        yield from _iter_dicts(conn, query, params)
+
+
+def fetch_meetings(user_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    return list(iter_meetings(user_id, limit))
+
+
+def iter_meetings(user_id: int, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield a user's meetings one at a time, straight off the cursor.
     
-    query += " ORDER BY emails.date DESC NULLS LAST, emails.created_at DESC"
-    if limit is not None:
-        query += " LIMIT ?"
-        params.append(limit)
-    rows = conn.execute(query, params).fetchall()
-    meetings: List[Dict[str, Any]] = []
-    for row in rows:
-        record = dict(row)
+    The list endpoints stream these to the client, so only one row is decoded at a
+    time instead of the whole result set.
+    """
+    for record in _iter_email_items("meetings", _MEETING_COLUMNS, user_id, limit, date_as="email_date"):
         # Map email_date to date for consistency with frontend
-        if "email_date" in record:
-            record["date"] = record["email_date"]
-        attendees_payload = record.get("attendees_json")
-        if attendees_payload:
-            try:
-                record["attendees_json"] = json.loads(attendees_payload)
-            except json.JSONDecodeError:
-                record["attendees_json"] = {}
-        else:
-            record["attendees_json"] = {}
-        meetings.append(record)
-    return meetings
+        record["date"] = record["email_date"]
+        record["attendees_json"] = _decode_attendees(record["attendees_json"])
+        yield record
+
+
+def fetch_tasks(user_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    return list(iter_tasks(user_id, limit))
+
+
+def iter_tasks(user_id: int, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Yield a user's tasks one at a time (see iter_meetings)."""
+    for record in _iter_email_items("tasks", _TASK_COLUMNS, user_id, limit):
+        # Tasks have no attendees, but the frontend shares the meeting card shape
+        record["attendees_json"] = {}
+        yield record
 
 
 def fetch_junk_emails(user_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
-    conn = get_connection()
-    # Get user's email to filter out self-sent emails
-    user = get_user_by_id(user_id)
-    user_email = user.get("email") if user else None
-    
-    query = """
-        SELECT DISTINCT
-            emails.id, emails.user_id, emails.gmail_message_id, emails.sender, 
-            emails.subject, emails.date, emails.body, emails.snippet, emails.raw_json,
-            emails.created_at,
-            classifications.category,
-            unsubscribe_entries.unsubscribe_url
-        FROM emails
-        JOIN classifications ON classifications.email_id = emails.id
-        LEFT JOIN unsubscribe_entries ON unsubscribe_entries.email_id = emails.id
-        WHERE emails.user_id = ?
-          AND classifications.category IN ('junk', 'newsletter')
-          AND (emails.hidden IS NULL OR emails.hidden = 0)
-    """
-    params: List[Any] = [user_id]
-    
-    # Exclude emails sent by the user (only show incoming emails)
-    if user_email:
-        query += " AND (emails.sender IS NULL OR emails.sender NOT LIKE ?)"
-        params.append(f"%{user_email}%")
-    
-    query += " ORDER BY emails.date DESC NULLS LAST, emails.created_at DESC"
-    if limit is not None:
-        query += " LIMIT ?"
-        params.append(limit)
-    rows = conn.execute(query, params).fetchall()
-    return [dict(row) for row in rows]
+    return list(iter_junk_emails(user_id, limit))
+
+
+def iter_junk_emails(user_id: int, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Yield a user's junk/newsletter emails one at a time (see iter_meetings)."""
+    with reader() as conn:
+        query = """
+            SELECT DISTINCT
+                emails.id, emails.user_id, emails.gmail_message_id, emails.sender, 
+                emails.subject, emails.date, emails.body, emails.snippet, emails.raw_json,
+                emails.created_at,
+                classifications.category,
+                unsubscribe_entries.unsubscribe_url
+            FROM emails
+            JOIN classifications ON classifications.email_id = emails.id
+            LEFT JOIN unsubscribe_entries ON unsubscribe_entries.email_id = emails.id
+            WHERE emails.user_id = ?
+              AND classifications.category IN ('junk', 'newsletter')
+              AND (emails.hidden IS NULL OR emails.hidden = 0)
+              AND emails.is_self_sent = 0  -- only show incoming emails
+        """
+        params: List[Any] = [user_id]
+        
+        query += " ORDER BY emails.date DESC NULLS LAST, emails.created_at DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        yield from _iter_dicts(conn, query, params)
 
 
 def fetch_analytics(user_id: int) -> Dict[str, Any]:
-    conn = get_connection()
-    total_emails = conn.execute(
-        "SELECT COUNT(*) AS count FROM emails WHERE user_id = ? AND (hidden IS NULL OR hidden = 0)",
-        (user_id,),
-    ).fetchone()["count"]
-    processed_emails = conn.execute(
-        """
-        SELECT COUNT(DISTINCT classifications.email_id) AS count
-        FROM classifications
-        JOIN emails ON emails.id = classifications.email_id
-        WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
-        """,
-        (user_id,),
-    ).fetchone()["count"]
-    category_rows = conn.execute(
-        """
-        SELECT classifications.category, COUNT(*) AS count
-        FROM classifications
-        JOIN emails ON emails.id = classifications.email_id
-        WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
-        GROUP BY classifications.category
-        """,
-        (user_id,),
-    ).fetchall()
-    category_counts = {row["category"]: row["count"] for row in category_rows}
-    meeting_count = conn.execute(
-        """
-        SELECT COUNT(*) AS count
-        FROM meetings
-        JOIN emails ON emails.id = meetings.email_id
-        WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
-        """,
-        (user_id,),
-    ).fetchone()["count"]
-    task_count = conn.execute(
-        """
-        SELECT COUNT(*) AS count
-        FROM tasks
-        JOIN emails ON emails.id = tasks.email_id
-        WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
-        """,
-        (user_id,),
-    ).fetchone()["count"]
-    junk_count = sum(
-        count
-        for category, count in category_counts.items()
-        if category in ("junk", "newsletter")
-    )
-    return {
-        "total_emails": total_emails,
-        "processed_emails": processed_emails,
-        "category_counts": category_counts,
-        "meeting_count": meeting_count,
-        "task_count": task_count,
-        "junk_count": junk_count,
-    }
+    with reader() as conn:
+        # All the counters in one statement (one round trip instead of five). Each is
+        # its own scalar subquery rather than a correlated probe per email: SQLite
+        # plans those as index joins, which measured faster than summing EXISTS
+        # probes over the user's emails. junk_count counts classification rows, as
+        # the old Python sum over category_counts did.
+        totals = conn.execute(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM emails
+                 WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
+                ) AS total_emails,
+                (SELECT COUNT(DISTINCT classifications.email_id)
+                 FROM classifications
+                 JOIN emails ON emails.id = classifications.email_id
+                 WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
+                ) AS processed_emails,
+                (SELECT COUNT(*)
+                 FROM classifications
+                 JOIN emails ON emails.id = classifications.email_id
+                 WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
+                   AND classifications.category IN ('junk', 'newsletter')
+                ) AS junk_count,
+                (SELECT COUNT(*)
+                 FROM meetings
+                 JOIN emails ON emails.id = meetings.email_id
+                 WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
+                ) AS meeting_count,
+                (SELECT COUNT(*)
+                 FROM tasks
+                 JOIN emails ON emails.id = tasks.email_id
+                 WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
+                ) AS task_count
+            """,
+            (user_id,) * 5,
+        ).fetchone()
+        category_rows = conn.execute(
+            """
+            SELECT classifications.category, COUNT(*) AS count
+            FROM classifications
+            JOIN emails ON emails.id = classifications.email_id
+            WHERE emails.user_id = ? AND (emails.hidden IS NULL OR emails.hidden = 0)
+            GROUP BY classifications.category
+            """,
+            (user_id,),
+        ).fetchall()
+        category_counts = {row["category"]: row["count"] for row in category_rows}
+        return {
+            "total_emails": totals["total_emails"],
+            "processed_emails": totals["processed_emails"],
+            "category_counts": category_counts,
+            "meeting_count": totals["meeting_count"],
+            "task_count": totals["task_count"],
+            "junk_count": totals["junk_count"],
+        }
 
 
 # ---------------------------------------------------------------------------
@@ -951,64 +1680,74 @@ def create_meeting(
     confidence: float,
 ) -> Dict[str, Any]:
     """Create or update a meeting for an email. Only one meeting per email."""
+    # One upsert on the unique email_id index instead of a probe plus UPDATE/INSERT
     with cursor() as cur:
-        # Check if meeting already exists
-        existing = cur.execute(
-            "SELECT id FROM meetings WHERE email_id = ?",
-            (email_id,),
+        row = cur.execute(
+            """
+            INSERT INTO meetings (
+                email_id, title, start_time, end_time, location, attendees_json, confidence
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(email_id) DO UPDATE SET
+                title=excluded.title,
+                start_time=excluded.start_time,
+                end_time=excluded.end_time,
+                location=excluded.location,
+                attendees_json=excluded.attendees_json,
+                confidence=excluded.confidence
+            RETURNING *
+            """,
+            (
+                email_id,
+                title,
+                start_time,
+                end_time,
+                location,
+                json.dumps(attendees_json or {}),
+                confidence,
+            ),
         ).fetchone()
-        
-        if existing:
-            # Update existing meeting
-            cur.execute(
-                """
-                UPDATE meetings SET
-                    title = ?,
-                    start_time = ?,
-                    end_time = ?,
-                    location = ?,
-                    attendees_json = ?,
-                    confidence = ?
-                WHERE email_id = ?
-                """,
-                (
-                    title,
-                    start_time,
-                    end_time,
-                    location,
-                    json.dumps(attendees_json or {}),
-                    confidence,
-                    email_id,
-                ),
-            )
-        else:
-            # Insert new meeting
-            cur.execute(
-                """
-                INSERT INTO meetings (
-                    email_id, title, start_time, end_time, location, attendees_json, confidence
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    email_id,
-                    title,
-                    start_time,
-                    end_time,
-                    location,
-                    json.dumps(attendees_json or {}),
-                    confidence,
-                ),
-            )
-    return get_meeting_for_email(email_id)  # type: ignore[return-value]
+    return dict(row)
+
+
+def create_meetings_bulk(
+    rows: List[Tuple[int, Optional[str], Optional[str], Optional[str], Optional[str], Optional[Dict[str, Any]], float]],
+) -> None:
+    """
+    Create or update many meetings in one transaction.
+    
+    Same upsert as create_meeting(), run once through executemany(). Rows are
+    (email_id, title, start_time, end_time, location, attendees_json, confidence).
+    """
+    if not rows:
+        return
+    with cursor() as cur:
+        cur.executemany(
+            """
+            INSERT INTO meetings (
+                email_id, title, start_time, end_time, location, attendees_json, confidence
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(email_id) DO UPDATE SET
+                title=excluded.title,
+                start_time=excluded.start_time,
+                end_time=excluded.end_time,
+                location=excluded.location,
+                attendees_json=excluded.attendees_json,
+                confidence=excluded.confidence
+            """,
+            [
+                (email_id, title, start_time, end_time, location, json.dumps(attendees or {}), confidence)
+                for email_id, title, start_time, end_time, location, attendees, confidence in rows
+            ],
+        )
 
 
 def get_meeting_for_email(email_id: int) -> Optional[Dict[str, Any]]:
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT * FROM meetings WHERE email_id = ? ORDER BY id DESC LIMIT 1",
-        (email_id,),
-    ).fetchone()
-    return dict(row) if row else None
+    with reader() as conn:
+        row = conn.execute(
+            "SELECT * FROM meetings WHERE email_id = ? ORDER BY id DESC LIMIT 1",
+            (email_id,),
+        ).fetchone()
+        return dict(row) if row else None
 
 
 def create_task(
@@ -1020,54 +1759,64 @@ def create_task(
 ) -> Dict[str, Any]:
     """Create or update a task for an email. Only one task per email."""
     with cursor() as cur:
-        # Check if task already exists
-        existing = cur.execute(
-            "SELECT id FROM tasks WHERE email_id = ?",
-            (email_id,),
+        # An existing task is only refreshed while it's still pending - don't
+        # overwrite user changes. When the WHERE skips the update nothing is
+        # returned, so fall back to reading the untouched row.
+        row = cur.execute(
+            """
+            INSERT INTO tasks (email_id, description, due_date, status, confidence)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(email_id) DO UPDATE SET
+                description=excluded.description,
+                due_date=excluded.due_date,
+                confidence=excluded.confidence
+            WHERE tasks.status = 'pending'
+            RETURNING *
+            """,
+            (
+                email_id,
+                description,
+                due_date,
+                status,
+                confidence,
+            ),
         ).fetchone()
-        
-        if existing:
-            # Update existing task (preserve status - don't overwrite user changes)
-            cur.execute(
-                """
-                UPDATE tasks SET
-                    description = ?,
-                    due_date = ?,
-                    confidence = ?
-                WHERE email_id = ? AND status = 'pending'
-                """,
-                (
-                    description,
-                    due_date,
-                    confidence,
-                    email_id,
-                ),
-            )
-        else:
-            # Insert new task
-            cur.execute(
-                """
-                INSERT INTO tasks (email_id, description, due_date, status, confidence)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (
-                    email_id,
-                    description,
-                    due_date,
-                    status,
-                    confidence,
-                ),
-            )
-    return get_task_for_email(email_id)  # type: ignore[return-value]
+    if row is None:
+        return get_task_for_email(email_id)  # type: ignore[return-value]
+    return dict(row)
+
+
+def create_tasks_bulk(rows: List[Tuple[int, Optional[str], Optional[str], str, float]]) -> None:
+    """
+    Create or update many (email_id, description, due_date, status, confidence) tasks.
+    
+    Same upsert as create_task() - existing tasks are only refreshed while still
+    pending - run once through executemany() in one transaction.
+    """
+    if not rows:
+        return
+    with cursor() as cur:
+        cur.executemany(
+            """
+            INSERT INTO tasks (email_id, description, due_date, status, confidence)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(email_id) DO UPDATE SET
+                description=excluded.description,
+                due_date=excluded.due_date,
+                confidence=excluded.confidence
+            WHERE tasks.status = 'pending'
+            """,
+            rows,
+        )
 
 
 def get_task_for_email(email_id: int) -> Optional[Dict[str, Any]]:
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT * FROM tasks WHERE email_id = ? ORDER BY id DESC LIMIT 1",
-        (email_id,),
-    ).fetchone()
-    return dict(row) if row else None
+    with reader() as conn:
+        row = conn.execute(
+            "SELECT * FROM tasks WHERE email_id = ? ORDER BY id DESC LIMIT 1",
+            (email_id,),
+        ).fetchone()
+        return dict(row) if row else None
 
 
 def create_unsubscribe_entry(
@@ -1077,50 +1826,54 @@ def create_unsubscribe_entry(
 ) -> Dict[str, Any]:
     """Create or update an unsubscribe entry for an email. Only one entry per email."""
     with cursor() as cur:
-        # Check if unsubscribe entry already exists
-        existing = cur.execute(
-            "SELECT id FROM unsubscribe_entries WHERE email_id = ?",
-            (email_id,),
+        row = cur.execute(
+            """
+            INSERT INTO unsubscribe_entries (email_id, unsubscribe_url, status)
+            VALUES (?, ?, ?)
+            ON CONFLICT(email_id) DO UPDATE SET
+                unsubscribe_url=excluded.unsubscribe_url,
+                status=excluded.status
+            RETURNING *
+            """,
+            (
+                email_id,
+                unsubscribe_url,
+                status,
+            ),
         ).fetchone()
-        
-        if existing:
-            # Update existing entry
-            cur.execute(
-                """
-                UPDATE unsubscribe_entries SET
-                    unsubscribe_url = ?,
-                    status = ?
-                WHERE email_id = ?
-                """,
-                (
-                    unsubscribe_url,
-                    status,
-                    email_id,
-                ),
-            )
-        else:
-            # Insert new entry
-            cur.execute(
-                """
-                INSERT INTO unsubscribe_entries (email_id, unsubscribe_url, status)
-                VALUES (?, ?, ?)
-                """,
-                (
-                    email_id,
-                    unsubscribe_url,
-                    status,
-                ),
-            )
-    return get_unsubscribe_for_email(email_id)  # type: ignore[return-value]
+    return dict(row)
+
+
+def add_missing_unsubscribe_entries(entries: List[Tuple[int, Optional[str]]], status: str) -> None:
+    """
+    Create unsubscribe entries for emails that don't have one yet, in one transaction.
+    
+    Emails that already have an entry are left untouched.
+    
+    Args:
+        entries: (email_id, unsubscribe_url) pairs
+        status: Status for the new entries
+    """
+    if not entries:
+        return
+    with cursor() as cur:
+        cur.executemany(
+            """
+            INSERT INTO unsubscribe_entries (email_id, unsubscribe_url, status)
+            VALUES (?, ?, ?)
+            ON CONFLICT(email_id) DO NOTHING
+            """,
+            [(email_id, url, status) for email_id, url in entries],
+        )
 
 
 def get_unsubscribe_for_email(email_id: int) -> Optional[Dict[str, Any]]:
-    conn = get_connection()
-    row = conn.execute(
-        "SELECT * FROM unsubscribe_entries WHERE email_id = ? ORDER BY id DESC LIMIT 1",
-        (email_id,),
-    ).fetchone()
-    return dict(row) if row else None
+    with reader() as conn:
+        row = conn.execute(
+            "SELECT * FROM unsubscribe_entries WHERE email_id = ? ORDER BY id DESC LIMIT 1",
+            (email_id,),
+        ).fetchone()
+        return dict(row) if row else None
 
 
 def update_meetings_with_email_dates() -> int:
@@ -1132,7 +1885,12 @@ def update_meetings_with_email_dates() -> int:
     
     # Find meetings where start_time is NULL, empty, or potentially invalid
     # and update them to use the email's date
-    # This includes dates that look like defaults (October 2023) or are malformed
+    # This includes dates that look like defaults (October 2023) or are malformed.
+    # The cheap comparisons come first so the LIKE pattern only runs on rows that
+    # none of them caught:
+    # - '' sorts before '2020-01-01', so the range check covers empty strings too
+    # - the '2023-10-' prefix covers the old classifier's 2023-10-10 default as well
+    # - `date != ''` is never true for NULL, so it doubles as the IS NOT NULL check
     query = """
         UPDATE meetings
         SET start_time = (
@@ -1141,16 +1899,13 @@ def update_meetings_with_email_dates() -> int:
             WHERE emails.id = meetings.email_id
         )
         WHERE (meetings.start_time IS NULL 
-               OR meetings.start_time = ''
-               OR meetings.start_time NOT LIKE '%-%-%T%:%:%'
-               OR meetings.start_time LIKE '2023-10-10%'
-               OR meetings.start_time LIKE '2023-10-%'
                OR meetings.start_time < '2020-01-01'
-               OR meetings.start_time > '2030-12-31')
+               OR meetings.start_time > '2030-12-31'
+               OR substr(meetings.start_time, 1, 8) = '2023-10-'
+               OR meetings.start_time NOT LIKE '%-%-%T%:%:%')
           AND EXISTS (
               SELECT 1 FROM emails 
               WHERE emails.id = meetings.email_id 
-              AND emails.date IS NOT NULL 
               AND emails.date != ''
           )
     """
@@ -1166,32 +1921,5 @@ def update_all_meetings_with_email_dates() -> int:
     This is more aggressive and will update meetings even if they have a start_time
     that looks valid but might be wrong (e.g., default dates from old classifier).
     """
-    conn = get_connection()
-    
-    # Update all meetings to use email date as start_time if start_time is missing/invalid
-    # This catches dates that are clearly wrong (like October 2023 defaults)
-    query = """
-        UPDATE meetings
-        SET start_time = (
-            SELECT emails.date 
-            FROM emails 
-            WHERE emails.id = meetings.email_id
-        )
-        WHERE (meetings.start_time IS NULL 
-               OR meetings.start_time = ''
-               OR meetings.start_time NOT LIKE '%-%-%T%:%:%'
-               OR meetings.start_time LIKE '2023-10-10%'
-               OR meetings.start_time LIKE '2023-10-%'
-               OR meetings.start_time < '2020-01-01'
-               OR meetings.start_time > '2030-12-31')
-          AND EXISTS (
-              SELECT 1 FROM emails 
-              WHERE emails.id = meetings.email_id 
-              AND emails.date IS NOT NULL 
-              AND emails.date != ''
-          )
-    """
-    
-    cursor = conn.execute(query)
-    conn.commit()
-    return cursor.rowcount
+    # Both modes have always matched exactly the same rows, so share one query
+    return update_meetings_with_email_dates()
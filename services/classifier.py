@@ -12,25 +12,33 @@ The classifier also extracts structured data from emails (meeting times, task du
 """
 from __future__ import annotations
 
+import hashlib
 import html
 import json
 import logging
 import os
+import threading
 import time
+from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
 
 from openai import OpenAI
 
+from models.cache import TTLCache
 from models import (
     EmailCategory,
-    create_classification,
-    create_meeting,
-    create_task,
-    create_unsubscribe_entry,
+    add_missing_unsubscribe_entries,
+    batch,
+    create_classifications_bulk,
+    create_meetings_bulk,
+    create_tasks_bulk,
     fetch_unclassified_emails,
-    get_unsubscribe_for_email,
+    get_cached_classification,
+    store_cached_classification,
+    touch_cached_classifications,
 )
+from services.gmail_sync import _extract_bodies, extract_unsubscribe_url
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +51,61 @@ ALLOWED_CATEGORIES = {
     EmailCategory.OTHER.value,
 }
 
+# The same meeting titles, locations and task descriptions come back from the model
+# over and over (recurring invites, templated reminders), so entity decoding is memoized
+_unescape = lru_cache(maxsize=4096)(html.unescape)
+
+# Templated mail (newsletters, notifications, promos) arrives over and over with the
+# exact same sender/subject/body, so the model's answer for it is cached by content:
+# in memory here, and in the classification_cache table so it outlives the process.
+# Only categories whose result doesn't depend on the email's date are cached -
+# meetings/tasks resolve "tonight"/"tomorrow" against it, so those always go to OpenAI.
+_CACHEABLE_CATEGORIES = {
+    EmailCategory.JUNK.value,
+    EmailCategory.NEWSLETTER.value,
+    EmailCategory.OTHER.value,
+}
+# "other" is mostly one-off personal mail, so it only gets the bounded in-memory
+# cache; the shared table keeps just the bulk-mail categories
+_PERSISTED_CATEGORIES = {
+    EmailCategory.JUNK.value,
+    EmailCategory.NEWSLETTER.value,
+}
+_classification_cache = TTLCache(ttl=24 * 60 * 60, maxsize=4096)
+
+# Keys served from the cache since the last store_analyses(), which refreshes their
+# last_used in one write instead of a write per hit
+_cache_hits_lock = threading.Lock()
+_cache_hits: Set[str] = set()
+
+# The instructions are identical for every email, so they're built once and sent as
+# the system message. Keeping them as the first thing in every request means they
+# form a byte-identical prefix, which is what OpenAI's automatic prompt caching
+# matches on; only the user message (the email itself) differs between calls.
+_SYSTEM_PROMPT = (
+    "You output concise JSON only.\n"
+    "Classify: meeting, task, junk, newsletter, or other.\n"
+    "JSON: {category, confidence (0-1), "
+    "meeting{title,start_time ISO8601,end_time,location,attendees[]}, "
+    "task{description,due_date ISO8601}, unsubscribe_url, notes}\n"
+    "Dates: ISO8601 format YYYY-MM-DDTHH:mm:ss (no timezone = Eastern Time). Use 24-hour format.\n"
+    "Meetings: Extract time from content (e.g., '8PM', '7:45PM', '6pm'). Use meeting start time, not arrival. "
+    "'Tonight'/'today' = email date. 'Tomorrow' = email date +1 day. "
+    "ALWAYS use the time mentioned in the email content. "
+    "CRITICAL: Use 24-hour format. PM times: '6pm'/'6PM' = 18:00, '4pm'/'4PM' = 16:00, '8pm'/'8PM' = 20:00, '12pm'/'noon' = 12:00. "
+    "AM times: '6am'/'6AM' = 06:00, '9am'/'9AM' = 09:00, '12am'/'midnight' = 00:00. "
+    "If time has no AM/PM and is 1-11 (e.g., '6', '4'), assume PM/afternoon (18:00, 16:00). "
+    "Only use email sent time if NO time is mentioned in the content. "
+    "End time: +1 hour if not specified."
+)
+
+
+def _record_cache_hit(cache_key: str, result: Dict[str, Any]) -> None:
+    # Only persisted results have a classification_cache row to keep fresh
+    if str(result.get("category") or "").lower() in _PERSISTED_CATEGORIES:
+        with _cache_hits_lock:
+            _cache_hits.add(cache_key)
+
 
 class EmailClassifier:
     """
@@ -63,10 +126,28 @@ class EmailClassifier:
         self.batch_size = batch_size
         self.max_workers = max_workers
         # Get OpenAI API key from environment
-        api_key = os.getenv("OPENAI_API_KEY")
-        self.client: Optional[OpenAI] = OpenAI(api_key=api_key) if api_key else None
-        if not api_key:
+        self._api_key = os.getenv("OPENAI_API_KEY")
+        if not self._api_key:
             logger.warning("OPENAI_API_KEY not set; classifier will fall back to 'other'.")
+        # The OpenAI client owns an HTTP connection pool, which must not be shared
+        # across fork() - so it's created lazily, once per process (see `client`).
+        # That lets the classifier itself be built in the gunicorn master (--preload).
+        self._client: Optional[OpenAI] = None
+        self._client_pid: Optional[int] = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self) -> Optional[OpenAI]:
+        """OpenAI client for the current process, or None if no API key is set."""
+        if not self._api_key:
+            return None
+        pid = os.getpid()
+        if self._client_pid != pid:
+            with self._client_lock:
+                if self._client_pid != pid:
+                    self._client = OpenAI(api_key=self._api_key)
+                    self._client_pid = pid
+        return self._client
 
     def classify_email(self, email_row: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -91,22 +172,33 @@ class EmailClassifier:
         body = (email_row.get("body") or email_row.get("snippet") or "")[:4000]
         email_date = email_row.get("date") or ""
         
-        # Build the prompt for OpenAI
-        # This tells OpenAI what we want it to do and what format to return
+        cache_key = hashlib.blake2b(
+            "\0".join((
+                self.model,
+                email_row.get("sender") or "",
+                email_row.get("subject") or "",
+                body,
+            )).encode("utf-8"),
+            digest_size=16,
+        ).hexdigest()
+        cached = _classification_cache.get(cache_key)
+        if cached is not None:
+            _record_cache_hit(cache_key, cached)
+            return dict(cached)
+        # Not in this process yet - another worker, or an earlier run, may have seen it
+        try:
+            cached = get_cached_classification(cache_key)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Classification cache lookup failed: %s", exc)
+            cached = None
+        if cached is not None:
+            _classification_cache.set(cache_key, cached)
+            _record_cache_hit(cache_key, cached)
+            return dict(cached)
+        
+        # Only the email-specific part is built per call; the fixed instructions
+        # live in _SYSTEM_PROMPT, ahead of it
         prompt = (
-            "Classify: meeting, task, junk, newsletter, or other.\n"
-            "JSON: {category, confidence (0-1), "
-            "meeting{title,start_time ISO8601,end_time,location,attendees[]}, "
-            "task{description,due_date ISO8601}, unsubscribe_url, notes}\n"
-            "Dates: ISO8601 format YYYY-MM-DDTHH:mm:ss (no timezone = Eastern Time). Use 24-hour format.\n"
-            "Meetings: Extract time from content (e.g., '8PM', '7:45PM', '6pm'). Use meeting start time, not arrival. "
-            "'Tonight'/'today' = email date. 'Tomorrow' = email date +1 day. "
-            "ALWAYS use the time mentioned in the email content. "
-            "CRITICAL: Use 24-hour format. PM times: '6pm'/'6PM' = 18:00, '4pm'/'4PM' = 16:00, '8pm'/'8PM' = 20:00, '12pm'/'noon' = 12:00. "
-            "AM times: '6am'/'6AM' = 06:00, '9am'/'9AM' = 09:00, '12am'/'midnight' = 00:00. "
-            "If time has no AM/PM and is 1-11 (e.g., '6', '4'), assume PM/afternoon (18:00, 16:00). "
-            "Only use email sent time if NO time is mentioned in the content. "
-            "End time: +1 hour if not specified.\n"
             f"Email date: {email_date}\n"
             f"From: {email_row.get('sender') or 'Unknown'}\n"
             f"Subject: {email_row.get('subject') or 'No subject'}\n"
@@ -119,7 +211,7 @@ class EmailClassifier:
                 temperature=0.2,
                 response_format={"type": "json_object"},
                 messages=[
-                    {"role": "system", "content": "You output concise JSON only."},
+                    {"role": "system", "content": _SYSTEM_PROMPT},
                     {"role": "user", "content": prompt},
                 ],
             )
@@ -141,43 +233,91 @@ class EmailClassifier:
                 "confidence": 0.0,
                 "notes": f"classifier_error: {exc}",
             }
+        else:
+            category = str(data.get("category") or "").lower()
+            if category in _CACHEABLE_CATEGORIES:
+                _classification_cache.set(cache_key, data)
+            if category in _PERSISTED_CATEGORIES:
+                try:
+                    store_cached_classification(cache_key, data)
+                except Exception as exc:  # noqa: BLE001
+                    logger.warning("Failed to store classification in cache: %s", exc)
         return data
 
     def process_email(self, email_row: Dict[str, Any]) -> Dict[str, Any]:
+        """Classify one email and store the results."""
+        analysis = self.analyze_email(email_row)
+        self.store_analyses([analysis])
+        return analysis["result"]
+
+    def process_emails(self, email_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Classify a batch of emails and store the results in one transaction.
+        
+        The OpenAI calls run in parallel, paced like process_all_unprocessed_emails().
+        Returns one status per email, in order: {"email_id", "ok": True, "result"} or
+        {"email_id", "ok": False, "error"}. Emails that failed are not stored.
+        """
+        if not email_rows:
+            return []
+        statuses: List[Dict[str, Any]] = []
+        analyses: List[Dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(email_rows))) as executor:
+            futures = [executor.submit(self._analyze_paced, row) for row in email_rows]
+            for email_row, future in zip(email_rows, futures):
+                try:
+                    analysis = future.result()
+                except Exception as exc:  # noqa: BLE001
+                    logger.exception("Failed to classify email %s: %s", email_row.get("id"), exc)
+                    statuses.append({"email_id": email_row.get("id"), "ok": False, "error": str(exc)})
+                    continue
+                analyses.append(analysis)
+                statuses.append({"email_id": email_row["id"], "ok": True, "result": analysis["result"]})
+        self.store_analyses(analyses)
+        return statuses
+
+    def analyze_email(self, email_row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Classify an email and work out the rows to store for it, without writing any.
+        
+        Kept separate from store_analyses() so a whole batch of OpenAI calls can run
+        in parallel and then be written in a single transaction.
+        """
         result = self.classify_email(email_row)
         raw_category = (result.get("category") or EmailCategory.OTHER.value).lower()
         category = raw_category if raw_category in ALLOWED_CATEGORIES else EmailCategory.OTHER.value
         confidence = float(result.get("confidence") or 0.0)
-
-        create_classification(
-            email_id=email_row["id"],
-            category=category,
-            confidence=confidence,
-        )
+        analysis: Dict[str, Any] = {
+            "email_id": email_row["id"],
+            "category": category,
+            "confidence": confidence,
+            "meeting": None,
+            "task": None,
+            "unsubscribe_url": None,
+            "result": result,
+        }
 
         if category == EmailCategory.MEETING.value:
             meeting = result.get("meeting") or {}
             title = meeting.get("title")
             if title:
                 try:
-                    title = html.unescape(str(title))
+                    title = _unescape(str(title))
                 except (ValueError, TypeError):
                     pass
             location = meeting.get("location")
             if location:
                 try:
-                    location = html.unescape(str(location))
+                    location = _unescape(str(location))
                 except (ValueError, TypeError):
                     pass
-            create_meeting(
-                email_id=email_row["id"],
-                title=title,
-                start_time=meeting.get("start_time") or meeting.get("start"),
-                end_time=meeting.get("end_time"),
-                location=location,
-                attendees_json={"attendees": meeting.get("attendees") or []},
-                confidence=confidence,
-            )
+            analysis["meeting"] = {
+                "title": title,
+                "start_time": meeting.get("start_time") or meeting.get("start"),
+                "end_time": meeting.get("end_time"),
+                "location": location,
+                "attendees_json": {"attendees": meeting.get("attendees") or []},
+            }
 
         if category == EmailCategory.TASK.value:
             task = result.get("task") or {}
@@ -185,16 +325,13 @@ class EmailClassifier:
             description = task.get("description") or email_row.get("subject")
             if description:
                 try:
-                    description = html.unescape(str(description))
+                    description = _unescape(str(description))
                 except Exception:
                     pass
-            create_task(
-                email_id=email_row["id"],
-                description=description,
-                due_date=task.get("due_date"),
-                status="pending",
-                confidence=confidence,
-            )
+            analysis["task"] = {
+                "description": description,
+                "due_date": task.get("due_date"),
+            }
 
         # Extract unsubscribe URL - prefer OpenAI result, but also check email headers/body
         unsubscribe_url = (
@@ -204,9 +341,6 @@ class EmailClassifier:
         
         # If OpenAI didn't find one, try extracting from email data
         if not unsubscribe_url:
-            from services.gmail_sync import extract_unsubscribe_url
-            import json
-            
             # Try to get headers and body from raw_json
             raw_json_str = email_row.get("raw_json")
             headers = {}
@@ -228,10 +362,9 @@ class EmailClassifier:
                             headers[name] = header.get("value", "")
                     
                     # Get body - prefer HTML for better link extraction, fallback to plain text
-                    from services.gmail_sync import _extract_body
-                    # Try HTML first for better link detection
-                    html_body = _extract_body(payload, prefer_html=True)
-                    plain_body = _extract_body(payload, prefer_html=False)
+                    # HTML is preferred for better link detection; both variants come
+                    # out of a single walk of the MIME tree
+                    html_body, plain_body = _extract_bodies(payload)
                     stored_body = email_row.get("body") or ""
                     
                     # Use the longest body available (HTML usually has more content)
@@ -250,16 +383,58 @@ class EmailClassifier:
         
         # Create unsubscribe entry for ALL emails if we found a URL (not just junk/newsletter)
         # This allows unsubscribe buttons on meetings, tasks, etc.
-        # Also check if one already exists to avoid duplicates
-        if unsubscribe_url:
-            existing = get_unsubscribe_for_email(email_row["id"])
-            if not existing:
-                create_unsubscribe_entry(
-                    email_id=email_row["id"],
-                    unsubscribe_url=unsubscribe_url,
-                    status="pending",
+        analysis["unsubscribe_url"] = unsubscribe_url
+        return analysis
+
+    @staticmethod
+    def store_analyses(analyses: List[Dict[str, Any]]) -> None:
+        """Write the rows from analyze_email() for any number of emails in one transaction."""
+        if not analyses:
+            return
+        global _cache_hits
+        with _cache_hits_lock:
+            cache_hits, _cache_hits = _cache_hits, set()
+        # One executemany per table, all in a single transaction
+        with batch():
+            create_classifications_bulk(
+                [(a["email_id"], a["category"], a["confidence"]) for a in analyses]
+            )
+            create_meetings_bulk([
+                (
+                    a["email_id"],
+                    a["meeting"]["title"],
+                    a["meeting"]["start_time"],
+                    a["meeting"]["end_time"],
+                    a["meeting"]["location"],
+                    a["meeting"]["attendees_json"],
+                    a["confidence"],
                 )
-        return result
+                for a in analyses if a.get("meeting")
+            ])
+            create_tasks_bulk([
+                (a["email_id"], a["task"]["description"], a["task"]["due_date"], "pending", a["confidence"])
+                for a in analyses if a.get("task")
+            ])
+            # Emails that already have an unsubscribe entry keep it (avoids duplicates)
+            add_missing_unsubscribe_entries(
+                [(a["email_id"], a["unsubscribe_url"]) for a in analyses if a.get("unsubscribe_url")],
+                status="pending",
+            )
+            touch_cached_classifications(cache_hits)
+
+    def _analyze_paced(self, email_row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        analyze_email(), then pause `rate_delay` before the worker takes its next email.
+        
+        Pacing in the worker caps each thread's request rate to respect OpenAI rate
+        limits. (Sleeping in the collecting loop instead didn't slow the requests at
+        all - they were all submitted up front - it only delayed the batch's write.)
+        """
+        try:
+            return self.analyze_email(email_row)
+        finally:
+            if self.rate_delay > 0:
+                time.sleep(self.rate_delay)
 
     def process_all_unprocessed_emails(self, user_id: int, batch_size: Optional[int] = None) -> int:
         """Process all emails without classifications using parallel processing for speed."""
@@ -270,45 +445,48 @@ class EmailClassifier:
 
         logger.info(f"Starting batch classification for user {user_id} (batch_size={size})")
 
-        while True:
-            batch_start = time.time()
-            emails = fetch_unclassified_emails(user_id, limit=size)
-            if not emails:
-                break
-            
-            logger.info(f"Processing batch of {len(emails)} emails")
-            
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+        # One pool for the whole run rather than spinning up fresh threads per batch
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                batch_start = time.time()
+                emails = fetch_unclassified_emails(user_id, limit=size)
+                if not emails:
+                    break
+                
+                logger.info(f"Processing batch of {len(emails)} emails")
+                
+                # The OpenAI calls run in parallel; everything they produce is then
+                # written in one transaction per batch instead of several commits per email
+                analyses: List[Dict[str, Any]] = []
                 future_to_email = {
-                    executor.submit(self.process_email, email): email
+                    executor.submit(self._analyze_paced, email): email
                     for email in emails
                 }
                 
                 for future in as_completed(future_to_email):
                     email = future_to_email[future]
                     try:
-                        future.result()  # Wait for completion and raise any exceptions
+                        analyses.append(future.result())  # Raises if the email failed
                         processed += 1
-                        # Small delay to respect rate limits (reduced from per-email to per-batch)
-                        if self.rate_delay > 0:
-                            time.sleep(self.rate_delay / self.max_workers)
                     except Exception as exc:  # noqa: BLE001
                         logger.exception("Failed to process email %s: %s", email.get("id"), exc)
-                        create_classification(
-                            email_id=email["id"],
-                            category=EmailCategory.OTHER.value,
-                            confidence=0.0,
-                        )
+                        # Still mark it classified, so the next batch doesn't pick it up again
+                        analyses.append({
+                            "email_id": email["id"],
+                            "category": EmailCategory.OTHER.value,
+                            "confidence": 0.0,
+                        })
                         failed += 1
-            
-            batch_duration = time.time() - batch_start
-            logger.info(
-                f"Batch completed: {processed} processed, {failed} failed, "
-                f"duration {batch_duration:.2f}s ({len(emails)/batch_duration:.1f} emails/sec)"
-            )
-            
-            if len(emails) < size:
-                break
+                self.store_analyses(analyses)
+                
+                batch_duration = time.time() - batch_start
+                logger.info(
+                    f"Batch completed: {processed} processed, {failed} failed, "
+                    f"duration {batch_duration:.2f}s ({len(emails)/batch_duration:.1f} emails/sec)"
+                )
+                
+                if len(emails) < size:
+                    break
         
         total_duration = time.time() - start_time
         logger.info(
@@ -8,16 +8,29 @@ This module handles Gmail API authentication:
 """
 from __future__ import annotations
 
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, Optional
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 
 from config import Config
 from models import get_credentials_for_user, upsert_credentials
 
+# Credentials that were fresh when last handed out, per user. An access token is good
+# for an hour, and every Gmail service build inside that hour can reuse it instead of
+# re-reading the credentials row and rebuilding the object.
+_fresh_credentials: Dict[int, Credentials] = {}
+_fresh_credentials_lock = threading.Lock()
+# Cached credentials this close to expiry go through the normal refresh path again
+_EXPIRY_MARGIN = timedelta(seconds=60)
+# The Gmail discovery document bundled with google-api-python-client, read from disk
+# once instead of on every service build (None if this client version doesn't ship it)
+_GMAIL_DISCOVERY_DOC = get_static_doc("gmail", "v1")
+
 
 def _build_credentials(record: Dict[str, Any]) -> Credentials:
     """
@@ -55,15 +68,28 @@ def _ensure_fresh_credentials(user_id: int) -> Optional[Credentials]:
     Access tokens expire after 1 hour. This function checks if the token is expired
     and refreshes it using the refresh token if needed.
     """
+    # Reuse the credentials from an earlier call while their token is still good
+    cached = _fresh_credentials.get(user_id)
+    if cached is not None and cached.expiry is not None:
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if cached.expiry - now > _EXPIRY_MARGIN:
+            return cached
+    
     # Get stored credentials from database
     record = get_credentials_for_user(user_id)
     if not record:
+        forget_credentials(user_id)
         return None
     # Build credentials object
     creds = _build_credentials(record)
     # If expired, refresh it
     if creds.expired and creds.refresh_token:
-        creds.refresh(Request())  # Get new access token
+        try:
+            creds.refresh(Request())  # Get new access token
+        except Exception:
+            forget_credentials(user_id)
+            raise
         # Save the new token to database
         upsert_credentials(
             user_id=user_id,
@@ -71,9 +97,23 @@ def _ensure_fresh_credentials(user_id: int) -> Optional[Credentials]:
             refresh_token=creds.refresh_token or "",
             token_expiry=creds.expiry.isoformat() if creds.expiry else None,
         )
+    # Without a known expiry there's no way to tell when to stop reusing them
+    if creds.token and creds.expiry is not None:
+        with _fresh_credentials_lock:
+            _fresh_credentials[user_id] = creds
     return creds
 
 
+def forget_credentials(user_id: int) -> None:
+    """
+    Drop a user's cached credentials so the next call reads them from the database.
+    
+    Call this after storing new tokens for the user (e.g. when they log in again).
+    """
+    with _fresh_credentials_lock:
+        _fresh_credentials.pop(user_id, None)
+
+
 def build_gmail_service(user_id: int):
     """
     Return a Gmail API service instance for the given user, or None if missing creds.
@@ -85,6 +125,8 @@ def build_gmail_service(user_id: int):
     if not creds:
         return None
     # Build and return Gmail API service
+    if _GMAIL_DISCOVERY_DOC:
+        return build_from_document(_GMAIL_DISCOVERY_DOC, credentials=creds)
     return build("gmail", "v1", credentials=creds, cache_discovery=False)
 
 
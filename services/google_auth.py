@@ -10,16 +10,29 @@ This module handles Google OAuth authentication:
 from __future__ import annotations
 
 import os
-from typing import Dict, Tuple
+from functools import lru_cache
+from typing import Any, Dict, Tuple
 
 from flask import current_app
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 
 # Google OAuth endpoints
 GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"  # Where to exchange codes for tokens
 GOOGLE_AUTH_URI = "https://accounts.google.com/o/oauth2/auth"  # Google's login page
 
+# The oauth2 discovery document ships with google-api-python-client; read it from
+# disk once instead of on every login (None if this client version doesn't bundle it)
+_OAUTH2_DISCOVERY_DOC = get_static_doc("oauth2", "v2")
+
+_OAUTH_SCOPES = [
+    "openid",
+    "https://www.googleapis.com/auth/userinfo.email",
+    "https://www.googleapis.com/auth/userinfo.profile",
+    "https://www.googleapis.com/auth/gmail.readonly",
+]
+
 
 def _get_redirect_uri() -> str:
     """
@@ -32,34 +45,36 @@ def _get_redirect_uri() -> str:
     """
     try:
         # Try to get from Flask config first (preferred)
-        redirect_uri = current_app.config.get("GOOGLE_REDIRECT_URI")
-        if redirect_uri:
-            # Validate it's not the frontend URL
-            # The frontend can't handle OAuth callbacks - only the backend can
-            if redirect_uri == "http://localhost:5173" or redirect_uri.startswith("http://localhost:5173/"):
-                raise RuntimeError(
-                    "GOOGLE_REDIRECT_URI cannot be the frontend URL (localhost:5173). "
-                    "It must be the backend callback URL: http://localhost:5001/oauth2callback"
-                )
-            return redirect_uri
-    except RuntimeError as e:
-        # Re-raise RuntimeError (our validation error)
-        if "frontend URL" in str(e):
-            raise
+        config_uri = current_app.config.get("GOOGLE_REDIRECT_URI")
+    except RuntimeError:
         # Not in Flask app context, fall back to env var
-        pass
+        config_uri = None
+    return _resolve_redirect_uri(config_uri, os.getenv("GOOGLE_REDIRECT_URI"))
+
+
+@lru_cache(maxsize=2)
+def _resolve_redirect_uri(config_uri: str | None, env_uri: str | None) -> str:
+    """Validate and pick the redirect URI; cached since the settings don't change at runtime."""
+    if config_uri:
+        # Validate it's not the frontend URL
+        # The frontend can't handle OAuth callbacks - only the backend can
+        if config_uri == "http://localhost:5173" or config_uri.startswith("http://localhost:5173/"):
+            raise RuntimeError(
+                "GOOGLE_REDIRECT_URI cannot be the frontend URL (localhost:5173). "
+                "It must be the backend callback URL: http://localhost:5001/oauth2callback"
+            )
+        return config_uri
     
     # Fall back to environment variable if not in Flask context
-    redirect_uri = os.getenv("GOOGLE_REDIRECT_URI")
-    if redirect_uri:
+    if env_uri:
         # Validate it's not the frontend URL
-        if redirect_uri == "http://localhost:5173" or redirect_uri.startswith("http://localhost:5173/"):
+        if env_uri == "http://localhost:5173" or env_uri.startswith("http://localhost:5173/"):
             raise RuntimeError(
                 "GOOGLE_REDIRECT_URI is incorrectly set to the frontend URL. "
                 "It must be the backend callback URL: http://localhost:5001/oauth2callback. "
                 "Either unset GOOGLE_REDIRECT_URI to use the default, or set it to the correct backend URL."
             )
-        return redirect_uri
+        return env_uri
     
     # No redirect URI set - this is OK in development (config will provide default)
     # But we need to raise an error here since we're not in app context
@@ -71,24 +86,28 @@ def _get_redirect_uri() -> str:
     )
 
 
-def _create_oauth_flow(state: str | None = None) -> Flow:
-    redirect_uri = _get_redirect_uri()
-    client_config = {
+@lru_cache(maxsize=2)
+def _client_config(
+    redirect_uri: str, client_id: str | None, client_secret: str | None
+) -> Dict[str, Any]:
+    # Built once per distinct setting instead of on every OAuth call
+    return {
         "web": {
-            "client_id": os.getenv("GOOGLE_CLIENT_ID"),
-            "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
+            "client_id": client_id,
+            "client_secret": client_secret,
             "redirect_uris": [redirect_uri],
             "auth_uri": GOOGLE_AUTH_URI,
             "token_uri": GOOGLE_TOKEN_URI,
         }
     }
-    scopes = [
-        "openid",
-        "https://www.googleapis.com/auth/userinfo.email",
-        "https://www.googleapis.com/auth/userinfo.profile",
-        "https://www.googleapis.com/auth/gmail.readonly",
-    ]
-    flow = Flow.from_client_config(client_config, scopes=scopes, state=state)
+
+
+def _create_oauth_flow(state: str | None = None) -> Flow:
+    redirect_uri = _get_redirect_uri()
+    client_config = _client_config(
+        redirect_uri, os.getenv("GOOGLE_CLIENT_ID"), os.getenv("GOOGLE_CLIENT_SECRET")
+    )
+    flow = Flow.from_client_config(client_config, scopes=_OAUTH_SCOPES, state=state)
     flow.redirect_uri = redirect_uri
     return flow
 
@@ -128,7 +147,10 @@ def fetch_user_profile(credentials) -> Dict[str, str]:
     This is how we know who logged in.
     """
     # Build the OAuth2 API service
-    oauth_service = build("oauth2", "v2", credentials=credentials, cache_discovery=False)
+    if _OAUTH2_DISCOVERY_DOC:
+        oauth_service = build_from_document(_OAUTH2_DISCOVERY_DOC, credentials=credentials)
+    else:
+        oauth_service = build("oauth2", "v2", credentials=credentials, cache_discovery=False)
     # Get user info
     user_info = oauth_service.userinfo().get().execute()
     return {
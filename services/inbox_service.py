@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Tuple
 
 from models import (
@@ -9,7 +10,7 @@ from models import (
     fetch_junk_emails,
     fetch_meetings,
     fetch_tasks,
-    fetch_unclassified_emails,
+    fetch_unclassified_email_ids,
     get_sync_stats,
 )
 from services.job_queue import get_job_queue
@@ -17,6 +18,11 @@ from services.jobs import ClassificationJob, GmailSyncJob
 
 logger = logging.getLogger(__name__)
 
+# The dashboard's five reads are independent, so they run side by side on pooled
+# reader connections. Shared across requests; threads start on first use, so a
+# gunicorn master (--preload) never owns any.
+_dashboard_pool = ThreadPoolExecutor(max_workers=5, thread_name_prefix="dashboard")
+
 
 def get_dashboard_view(
     user_id: int,
@@ -25,7 +31,13 @@ def get_dashboard_view(
     junk_limit: int = 6,
 ) -> Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
     """Return sync stats + dashboard data for a user."""
-    stats = get_sync_stats(user_id)
+    stats_future = _dashboard_pool.submit(get_sync_stats, user_id)
+    analytics_future = _dashboard_pool.submit(fetch_analytics, user_id)
+    meetings_future = _dashboard_pool.submit(fetch_meetings, user_id, limit=meetings_limit)
+    tasks_future = _dashboard_pool.submit(fetch_tasks, user_id, limit=tasks_limit)
+    junk_future = _dashboard_pool.submit(fetch_junk_emails, user_id, limit=junk_limit)
+    
+    stats = stats_future.result()
     sync_stats = {
         "synced_count": 0,
         "new_count": 0,
@@ -34,11 +46,13 @@ def get_dashboard_view(
         "unprocessed_emails": stats["unprocessed_emails"],
         "newly_processed": 0,
     }
-    analytics = fetch_analytics(user_id)
-    meetings = fetch_meetings(user_id, limit=meetings_limit)
-    tasks = fetch_tasks(user_id, limit=tasks_limit)
-    junk_emails = fetch_junk_emails(user_id, limit=junk_limit)
-    return sync_stats, analytics, meetings, tasks, junk_emails
+    return (
+        sync_stats,
+        analytics_future.result(),
+        meetings_future.result(),
+        tasks_future.result(),
+        junk_future.result(),
+    )
 
 
 def run_background_tick(user_id: int, classifier) -> None:
@@ -56,6 +70,9 @@ def run_background_tick(user_id: int, classifier) -> None:
                 job_type="gmail_sync",
                 user_id=user_id,
                 execute_fn=execute_fn,
+                max_retries=2,  # Gmail API hiccups (429/5xx) are usually transient
+                # A tick while the last sync is still pending reuses that job
+                dedupe_key=(user_id, "gmail_sync"),
             )
             logger.info(f"Enqueued sync job {job_id} for user {user_id}")
         except Exception as exc:
@@ -64,9 +81,8 @@ def run_background_tick(user_id: int, classifier) -> None:
 
         # Enqueue classification job for backlog
         try:
-            unprocessed = fetch_unclassified_emails(user_id, limit=100)
-            if unprocessed:
-                email_ids = [email["id"] for email in unprocessed]
+            email_ids = fetch_unclassified_email_ids(user_id, limit=100)
+            if email_ids:
                 classification_job = ClassificationJob(classifier).create(user_id, email_ids)
                 execute_fn = classification_job._execute_fn
                 if execute_fn is None:
@@ -75,6 +91,7 @@ def run_background_tick(user_id: int, classifier) -> None:
                     job_type="classification",
                     user_id=user_id,
                     execute_fn=execute_fn,
+                    dedupe_key=(user_id, "classification"),
                 )
                 logger.info(f"Enqueued classification job {job_id} for {len(email_ids)} emails")
         except Exception as exc:
@@ -10,17 +10,48 @@ the job status to see when it's done.
 """
 from __future__ import annotations
 
+import itertools
 import logging
+import os
+import sys
 import threading
 import time
-import uuid
+from collections import OrderedDict, deque
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, cast
+
+from models.db import close_connection
 
 logger = logging.getLogger(__name__)
 
+# Worker threads per process. Sync and classification jobs spend nearly all
+# their time waiting on the Gmail and OpenAI APIs, so a few more threads let that many
+# jobs overlap their network waits. Override with JOB_QUEUE_WORKERS.
+DEFAULT_JOB_QUEUE_WORKERS = 2
+# How many jobs the queue remembers for status lookups. Past this, the oldest finished
+# (complete/failed) jobs are forgotten; queued and running jobs are always kept.
+MAX_TRACKED_JOBS = 1024
+
+
+def _configured_worker_count() -> int:
+    """Read JOB_QUEUE_WORKERS, falling back to the default on a missing or bad value."""
+    raw = os.getenv("JOB_QUEUE_WORKERS")
+    if not raw:
+        return DEFAULT_JOB_QUEUE_WORKERS
+    try:
+        workers = int(raw)
+    except ValueError:
+        workers = 0
+    if workers < 1:
+        logger.warning(
+            "Ignoring invalid JOB_QUEUE_WORKERS=%r, using %d",
+            raw, DEFAULT_JOB_QUEUE_WORKERS,
+        )
+        return DEFAULT_JOB_QUEUE_WORKERS
+    return workers
+
 
 class JobStatus(str, Enum):
     """Job execution status."""
@@ -31,7 +62,12 @@ class JobStatus(str, Enum):
     FAILED = "failed"
 
 
-@dataclass
+# Slotted dataclasses (no per-instance __dict__) need Python 3.10; the deploy image
+# (nixpacks.toml) still runs 3.9, where Job stays a regular dataclass
+_SLOTS: Dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_SLOTS)
 class Job:
     """Represents a background job."""
 
@@ -42,20 +78,24 @@ class Job:
     created_at: datetime = field(default_factory=datetime.utcnow)
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None  # Run time of the last attempt (monotonic clock)
     progress: Dict[str, Any] = field(default_factory=dict)
     error: Optional[str] = None
     result: Optional[Dict[str, Any]] = None
-
-    def __post_init__(self) -> None:
-        """Store execute function separately (not in dataclass fields)."""
-        self._execute_fn: Optional[Callable[[], Dict[str, Any]]] = None
+    attempts: int = 0  # How many times the job has been started
+    max_retries: int = 0  # How many times to re-run the job after a failure
+    dedupe_key: Optional[Hashable] = None  # See JobQueue.enqueue()
+    # Set with set_execute_fn() rather than passed to the constructor
+    _execute_fn: Optional[Callable[[], Dict[str, Any]]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def set_execute_fn(self, fn: Callable[[], Dict[str, Any]]) -> None:
         """Set the execute function for this job."""
         self._execute_fn = fn
 
     def execute(self) -> Dict[str, Any]:
-        """Execute the job and return results."""
+        """Execute the job and return results (JobQueue calls _execute_fn directly)."""
         if not self._execute_fn:
             raise ValueError(f"Job {self.job_id} has no execute function")
         return self._execute_fn()
@@ -70,35 +110,71 @@ class JobQueue:
     The queue processes jobs one at a time (or a few at a time with multiple workers).
     """
 
-    def __init__(self, max_workers: int = 2) -> None:
+    def __init__(self, max_workers: int = 2, app: Optional[Any] = None) -> None:
         """
         Initialize the job queue.
 
         Args:
             max_workers: Maximum number of concurrent worker threads
                          (how many jobs can run at the same time)
+            app: Flask app whose app context jobs run in (needed for database access)
         """
-        self._jobs: Dict[str, Job] = {}  # All jobs by ID
-        self._lock = threading.Lock()  # Thread safety lock
-        self._queue: list[Job] = []  # Queue of jobs waiting to run
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()  # Jobs by ID, oldest first
+        # dedupe_key -> ID of the queued/running job enqueued with it (guarded by _jobs_lock)
+        self._inflight: Dict[Hashable, str] = {}
+        # Guards _jobs and _inflight only; the queue shards have their own locks, so
+        # status lookups and enqueue()'s bookkeeping never hold up workers dequeuing
+        self._jobs_lock = threading.Lock()
+        # Jobs waiting to run, one FIFO shard per worker so workers don't all contend
+        # on a single queue lock. Each shard has its own lock, and a semaphore that is
+        # released once per queued job so its idle worker blocks instead of polling.
+        self._shards: List[Deque[Job]] = [deque() for _ in range(max_workers)]
+        self._shard_locks = [threading.Lock() for _ in range(max_workers)]
+        self._shard_ready = [threading.Semaphore(0) for _ in range(max_workers)]
+        # Job IDs are "<pid>-<counter>" in hex: unique within the process (the only
+        # place a job can be looked up) without a uuid4() per job
+        self._id_counter = itertools.count(1)
+        self._id_prefix = f"{os.getpid():x}-"
         self._max_workers = max_workers
         self._active_workers = 0  # How many workers are currently running jobs
+        # Guards only _active_workers, so counter updates never hold up enqueue()
+        self._active_lock = threading.Lock()
         self._shutdown = False  # Flag to stop workers
         self._worker_threads: list[threading.Thread] = []  # List of worker threads
-        self._app: Optional[Any] = None  # Flask app instance for app context
-
-        # Start worker threads
-        # These threads continuously check the queue for new jobs
-        for i in range(max_workers):
-            thread = threading.Thread(
-                target=self._worker_loop,  # Function that runs in the thread
-                name=f"JobQueue-Worker-{i}",
-                daemon=True,  # Thread dies when main program exits
-            )
-            thread.start()
-            self._worker_threads.append(thread)
-
-        logger.info(f"JobQueue initialized with {max_workers} workers")
+        self._app: Optional[Any] = app  # Flask app instance for app context
+        self._retry_backoff = 2.0  # Seconds before the first retry; doubles each attempt
+        # PID the worker threads were started in. Threads don't survive fork(), so
+        # under `gunicorn --preload` a queue created in the master process would
+        # otherwise have no workers at all in the forked worker processes.
+        self._workers_pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+        logger.info("JobQueue initialized with %d workers", max_workers)
+
+    def _ensure_workers(self) -> None:
+        """Start the worker threads in this process if they aren't running yet."""
+        if self._workers_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._workers_pid == os.getpid():
+                return
+            # Threads copied from a parent process are gone; start fresh ones
+            self._worker_threads = []
+            # Start worker threads
+            # These threads continuously check the queue for new jobs
+            for i in range(self._max_workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,  # Function that runs in the thread
+                    args=(i,),  # The shard this worker owns
+                    name=f"JobQueue-Worker-{i}",
+                    daemon=True,  # Thread dies when main program exits
+                )
+                thread.start()
+                self._worker_threads.append(thread)
+            self._workers_pid = os.getpid()
+            # A forked child numbers its jobs under its own PID
+            self._id_prefix = f"{self._workers_pid:x}-"
+        logger.info("Started %d JobQueue workers in process %s", self._max_workers, self._workers_pid)
 
     def enqueue(
         self,
@@ -106,6 +182,8 @@ class JobQueue:
         user_id: int,
         execute_fn: Callable[[], Dict[str, Any]],
         job_id: Optional[str] = None,
+        max_retries: int = 0,
+        dedupe_key: Optional[Hashable] = None,
     ) -> str:
         """Enqueue a new job.
 
@@ -114,27 +192,64 @@ class JobQueue:
             user_id: User ID associated with the job
             execute_fn: Function to execute when job runs
             job_id: Optional custom job ID (auto-generated if not provided)
+            max_retries: How many times to retry the job if it raises. Retries are
+                         re-queued with exponential backoff (2s, 4s, 8s, ...), so
+                         transient Gmail/OpenAI errors don't fail the whole job.
+            dedupe_key: Optional key such as (user_id, job_type). While a job enqueued
+                        with the same key is queued or running (retries included), no
+                        new job is created and that job's ID is returned instead.
 
         Returns:
             Job ID string
         """
+        if execute_fn is None:
+            # Checked here once, so workers can call the function without re-checking
+            raise ValueError(f"Job of type {job_type} has no execute function")
+
+        self._ensure_workers()
         if job_id is None:
-            job_id = str(uuid.uuid4())
+            job_id = self._id_prefix + format(next(self._id_counter), "x")
 
         job = Job(
             job_id=job_id,
             job_type=job_type,
             user_id=user_id,
+            max_retries=max_retries,
+            dedupe_key=dedupe_key,
         )
         job.set_execute_fn(execute_fn)
 
-        with self._lock:
+        with self._jobs_lock:
+            if dedupe_key is not None:
+                existing_id = self._inflight.get(dedupe_key)
+                if existing_id is not None:
+                    logger.info("Job %s for %r is still pending, not enqueuing another", existing_id, dedupe_key)
+                    return existing_id
+                self._inflight[dedupe_key] = job_id
             self._jobs[job_id] = job
-            self._queue.append(job)
+            self._jobs.move_to_end(job_id)
+            self._forget_finished_jobs()
+        self._push(job)
 
-        logger.info(f"Enqueued job {job_id} (type: {job_type}, user: {user_id})")
+        logger.info("Enqueued job %s (type: %s, user: %s)", job_id, job_type, user_id)
         return job_id
 
+    def _forget_finished_jobs(self) -> None:
+        """Drop the oldest finished jobs beyond MAX_TRACKED_JOBS. Caller holds _jobs_lock."""
+        excess = len(self._jobs) - MAX_TRACKED_JOBS
+        if excess <= 0:
+            return
+        # Oldest first; usually the very first entries are finished ones
+        finished = itertools.islice(
+            (
+                job_id for job_id, job in self._jobs.items()
+                if job.status in (JobStatus.COMPLETE, JobStatus.FAILED)
+            ),
+            excess,
+        )
+        for job_id in list(finished):
+            del self._jobs[job_id]
+
     def get_job(self, job_id: str) -> Optional[Job]:
         """Get job status and details.
 
@@ -144,78 +259,137 @@ class JobQueue:
         Returns:
             Job object or None if not found
         """
-        with self._lock:
-            return self._jobs.get(job_id)
-
-    def _worker_loop(self) -> None:
-        """Worker thread main loop."""
+        # No lock: a single get() on the (C-implemented) OrderedDict is atomic under
+        # the GIL, and the status endpoint polls this constantly
+        return self._jobs.get(job_id)
+
+    def _push(self, job: Job) -> None:
+        """Queue a job on its user's shard and wake that shard's worker."""
+        # Partitioned by user: one user's burst of jobs lines up on a single shard,
+        # and the other workers keep serving everyone else (stealing only when idle)
+        index = hash(job.user_id) % self._max_workers
+        with self._shard_locks[index]:
+            self._shards[index].append(job)
+        self._shard_ready[index].release()
+
+    def _take(self, index: int) -> Optional[Job]:
+        """Pop the next job from shard `index`, or steal one from another shard."""
+        for offset in range(self._max_workers):
+            shard = (index + offset) % self._max_workers
+            with self._shard_locks[shard]:
+                if self._shards[shard]:
+                    return self._shards[shard].popleft()
+        return None
+
+    def _worker_loop(self, index: int) -> None:
+        """Worker thread main loop for the worker owning shard `index`."""
+        ran_job = False
         while not self._shutdown:
             job = None
             try:
-                # Get next job from queue
-                with self._lock:
-                    if self._queue:
-                        job = self._queue.pop(0)
-                        self._active_workers += 1
+                # Wait for a job on our shard. The timeout lets a shutdown be noticed,
+                # and on a timeout we still look for work so jobs queued behind a busy
+                # worker get stolen instead of waiting for it. Right after a job, look
+                # for the next one without waiting.
+                if not ran_job:
+                    self._shard_ready[index].acquire(timeout=0.5)
+                job = self._take(index)
+                ran_job = job is not None
 
                 if job:
+                    with self._active_lock:
+                        self._active_workers += 1
                     self._execute_job(job)
-                else:
-                    # No jobs available, sleep briefly
-                    time.sleep(0.1)
 
             except Exception:
                 logger.exception("Error in worker thread")
             finally:
                 if job:
-                    with self._lock:
+                    with self._active_lock:
                         self._active_workers -= 1
 
     def _execute_job(self, job: Job) -> None:
         """Execute a job and update its status."""
-        logger.info(f"Starting job {job.job_id} (type: {job.job_type})")
+        logger.info("Starting job %s (type: %s)", job.job_id, job.job_type)
         job.status = JobStatus.RUNNING
         job.started_at = datetime.utcnow()
+        job.attempts += 1
+        started = time.monotonic()
+        # Checked for None in enqueue()
+        execute_fn = cast(Callable[[], Dict[str, Any]], job._execute_fn)
 
         try:
             # Jobs need Flask app context for database operations
-            # We'll pass the app instance when creating the queue
-            if hasattr(self, '_app') and self._app:
+            # The app instance is pinned on the queue (see get_job_queue)
+            if self._app is not None:
                 with self._app.app_context():
-                    result = job.execute()
+                    result = execute_fn()
                     # Close DB connection after job completes
                     try:
-                        from models.db import close_connection
                         close_connection()
                     except Exception:
                         pass
             else:
-                # Fallback: try to get current app context
-                try:
-                    from flask import current_app
-                    with current_app.app_context():
-                        result = job.execute()
-                except RuntimeError:
-                    # No app context available, execute directly
-                    # (This may fail for DB operations)
-                    result = job.execute()
+                # No app given: worker threads have no app context, so the database
+                # layer falls back to a per-thread connection
+                result = execute_fn()
             
+            job.duration_seconds = time.monotonic() - started
             job.status = JobStatus.COMPLETE
             job.completed_at = datetime.utcnow()
             job.result = result
-            logger.info(
-                f"Completed job {job.job_id} in "
-                f"{(job.completed_at - job.started_at).total_seconds():.2f}s"
-            )
+            self._finish(job)
+            logger.info("Completed job %s in %.2fs", job.job_id, job.duration_seconds)
         except Exception as exc:
+            job.duration_seconds = time.monotonic() - started
+            job.error = str(exc)
+            if job.attempts <= job.max_retries:
+                # Transient failure - put the job back on the queue after a backoff
+                delay = self._retry_backoff * (2 ** (job.attempts - 1))
+                job.status = JobStatus.QUEUED
+                logger.warning(
+                    "Job %s failed (attempt %d/%d), retrying in %.0fs: %s",
+                    job.job_id, job.attempts, job.max_retries + 1, delay, exc,
+                )
+                self._schedule_retry(job, delay)
+                return
             job.status = JobStatus.FAILED
             job.completed_at = datetime.utcnow()
-            job.error = str(exc)
-            logger.exception(f"Job {job.job_id} failed: {exc}")
+            self._finish(job)
+            logger.exception("Job %s failed: %s", job.job_id, exc)
+
+    def _finish(self, job: Job) -> None:
+        """
+        Clean up after a job's final attempt (completed, or failed for good).
+
+        Lets new jobs be enqueued under its dedupe_key again, and drops the job's
+        execute function: it won't run again, and its closure (email ID lists, the
+        classifier) would otherwise live as long as the job stays in _jobs.
+        """
+        job._execute_fn = None
+        if job.dedupe_key is None:
+            return
+        with self._jobs_lock:
+            if self._inflight.get(job.dedupe_key) == job.job_id:
+                del self._inflight[job.dedupe_key]
+
+    def _schedule_retry(self, job: Job, delay: float) -> None:
+        """Re-queue a failed job after `delay` seconds without tying up a worker."""
+        def requeue() -> None:
+            if self._shutdown:
+                return
+            self._push(job)
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True  # Don't keep the process alive just to retry
+        timer.start()
 
     def shutdown(self) -> None:
         """Shutdown the job queue and wait for workers to finish."""
         self._shutdown = True
+        # Wake every idle worker so it sees the flag right away
+        for ready in self._shard_ready:
+            ready.release()
         for thread in self._worker_threads:
             thread.join(timeout=5.0)
 
@@ -232,8 +406,8 @@ def get_job_queue(app=None) -> JobQueue:
     """
     global _global_queue
     if _global_queue is None:
-        _global_queue = JobQueue(max_workers=2)
-    if app and not hasattr(_global_queue, '_app'):
+        _global_queue = JobQueue(max_workers=_configured_worker_count(), app=app)
+    elif app is not None and _global_queue._app is None:
         _global_queue._app = app
     return _global_queue
 
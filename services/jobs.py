@@ -4,8 +4,10 @@ from __future__ import annotations
 import logging
 from typing import Any, Dict, List
 
+from models import get_emails_by_ids
+from models.cache import invalidate_user
 from services.classifier import EmailClassifier
-from services.gmail_sync import sync_and_process_emails
+from services.gmail_sync import backfill_missing_bodies, sync_and_process_emails
 from services.job_queue import Job, get_job_queue
 
 logger = logging.getLogger(__name__)
@@ -27,11 +29,18 @@ class GmailSyncJob:
         """
         def execute() -> Dict[str, Any]:
             """Execute the sync job."""
-            logger.info(f"Starting Gmail sync job for user {user_id} (max_results={max_results})")
+            logger.info("Starting Gmail sync job for user %s (max_results=%s)", user_id, max_results)
+            # Persist bodies for older rows that were stored without one, so the
+            # API never has to re-extract them from raw_json at request time. Runs
+            # first: it only reads local rows, so a failing Gmail call can't skip it
+            backfilled = backfill_missing_bodies(user_id)
             result = sync_and_process_emails(user_id, max_results=max_results)
+            result["backfilled_bodies"] = backfilled
+            # New emails change every dashboard list, so drop the user's cached views
+            invalidate_user(user_id)
             logger.info(
-                f"Gmail sync job completed: {result.get('new_count', 0)} new emails, "
-                f"{result.get('skipped_count', 0)} skipped"
+                "Gmail sync job completed: %s new emails, %s skipped",
+                result.get("new_count", 0), result.get("skipped_count", 0),
             )
             return result
 
@@ -68,28 +77,43 @@ class ClassificationJob:
         def execute() -> Dict[str, Any]:
             """Execute the classification job."""
             logger.info(
-                f"Starting classification job for user {user_id}: "
-                f"{len(email_ids)} emails"
+                "Starting classification job for user %s: %d emails",
+                user_id, len(email_ids),
             )
             
-            from models import get_email_by_id
-            
             processed = 0
             failed = 0
             
+            # One query for every email instead of a round trip per ID
+            emails = get_emails_by_ids(email_ids)
+            found: List[Dict[str, Any]] = []
             for email_id in email_ids:
+                email = emails.get(email_id)
+                if not email:
+                    logger.warning("Email %s not found", email_id)
+                    failed += 1
+                    continue
+                found.append(email)
+            
+            # Classified a batch at a time: the batch's OpenAI calls overlap and its
+            # results are written in one transaction
+            size = self._classifier.batch_size
+            for start in range(0, len(found), size):
+                batch = found[start:start + size]
                 try:
-                    email = get_email_by_id(email_id)
-                    if not email:
-                        logger.warning(f"Email {email_id} not found")
+                    statuses = self._classifier.process_emails(batch)
+                except Exception:
+                    logger.exception("Failed to classify batch of %d emails", len(batch))
+                    failed += len(batch)
+                    continue
+                for status in statuses:
+                    if status["ok"]:
+                        processed += 1
+                    else:
                         failed += 1
-                        continue
-                    
-                    self._classifier.process_email(email)
-                    processed += 1
-                except Exception as exc:
-                    logger.exception(f"Failed to classify email {email_id}: {exc}")
-                    failed += 1
+            
+            # Classifications feed the meetings/tasks/junk lists; drop cached views
+            invalidate_user(user_id)
             
             result = {
                 "processed": processed,
@@ -97,7 +121,7 @@ class ClassificationJob:
                 "total": len(email_ids),
             }
             logger.info(
-                f"Classification job completed: {processed} processed, {failed} failed"
+                "Classification job completed: %d processed, %d failed", processed, failed
             )
             return result
 